@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Request, request, jsonify, send_from_directory, Response, g
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
@@ -6,9 +6,27 @@ import json
 import bcrypt
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
 import uuid
 from datetime import datetime, timedelta
 import secrets
+import tempfile
+import atexit
+import hashlib
+import base64
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from chatbot.chatbot import TerrenosChatbotBackend
+from snapshot import CatalogSnapshot, CatalogShards, CatalogState, parse_timestamp
+from detail_pages import DetailPageRenderer
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 # Load environment variables
 load_dotenv()
@@ -17,12 +35,19 @@ app = Flask(__name__)
 CORS(app)
 
 # Configuration
-UPLOAD_FOLDER = 'uploads'
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', str(16 * 1024 * 1024)))  # 16MB per file
+MAX_UPLOAD_REQUEST_SIZE = int(os.getenv('MAX_UPLOAD_REQUEST_SIZE', str(64 * 1024 * 1024)))  # whole request
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', str(os.cpu_count() or 2)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '400'))  # px, longest side
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_REQUEST_SIZE
+
+# Needed under gunicorn/uvicorn too, not only when run as __main__
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
 
 # Supabase configuration
@@ -30,29 +55,402 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_ANON_KEY')
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# Catalog cache configuration
+CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', '60'))  # seconds
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', '32'))
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', '60'))  # seconds, public responses
+
+# Session cache configuration
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '300'))  # seconds, capped by expires_at
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv('SESSION_CACHE_MAX_ENTRIES', '10000'))
+
+# Password hashing pool configuration
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(os.cpu_count() or 2)))
+BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', '32'))  # queued beyond busy workers
+BCRYPT_RETRY_AFTER = int(os.getenv('BCRYPT_RETRY_AFTER', '2'))  # seconds
+
+# last_login write-behind configuration
+LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv('LAST_LOGIN_FLUSH_INTERVAL', '5'))  # seconds
+LAST_LOGIN_BATCH_SIZE = int(os.getenv('LAST_LOGIN_BATCH_SIZE', '100'))
+
+# Pagination configuration
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '200'))
+
+# Chatbot configuration
+CHATBOT_DB_PATH = os.getenv('CHATBOT_DB_PATH', 'chatbot/chatbot.db')
+CHATBOT_MAX_SESSIONS = int(os.getenv('CHATBOT_MAX_SESSIONS', '10000'))  # in-memory contexts
+CHATBOT_SESSION_IDLE_TTL = float(os.getenv('CHATBOT_SESSION_IDLE_TTL', '1800'))  # seconds
+CHATBOT_MAX_MESSAGE_LENGTH = int(os.getenv('CHATBOT_MAX_MESSAGE_LENGTH', '2000'))
+
+# Static catalog snapshot configuration
+CATALOG_SNAPSHOT_DIR = os.getenv('CATALOG_SNAPSHOT_DIR', 'public')
+CATALOG_SNAPSHOT_COMPRESS = os.getenv('CATALOG_SNAPSHOT_COMPRESS', 'true').lower() == 'true'
+CATALOG_SYNC_ON_WRITE = os.getenv('CATALOG_SYNC_ON_WRITE', 'true').lower() == 'true'
+CATALOG_SYNC_OVERLAP = float(os.getenv('CATALOG_SYNC_OVERLAP', '5'))  # seconds re-read behind the watermark
+
+# Columns that may be requested through the fields= parameter
+TERRAIN_FIELDS = {
+    'id', 'name', 'price', 'currency', 'location', 'size', 'size_m2', 'badge',
+    'coordinates', 'description', 'features', 'availability', 'main_image',
+    'thumbnails', 'detail_page', 'enabled', 'created_by', 'created_at', 'updated_at'
+}
+# Selected when fields= is absent; size_m2 only exists once the schema
+# migration has run, so it is returned only when asked for
+TERRAIN_DEFAULT_FIELDS = TERRAIN_FIELDS - {'size_m2'}
+USER_FIELDS = {
+    'id', 'username', 'email', 'full_name', 'phone', 'birth_date', 'occupation',
+    'monthly_income', 'investment_budget', 'preferred_location', 'property_type',
+    'financing_needed', 'newsletter_subscription', 'interests', 'role',
+    'is_active', 'created_at', 'updated_at', 'last_login'
+}
+# Always selected so the keyset cursor can be built from the last row
+CURSOR_FIELDS = ('id', 'created_at')
+
+class TTLCache:
+    """Thread-safe in-memory cache with per-entry TTL, LRU size bound and
+    a version counter that is bumped on every invalidation."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, version=None, ttl=None):
+        with self._lock:
+            # Skip values computed before an invalidation happened
+            if version is not None and version != self.version:
+                return
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is None:
+            version = self.version
+            value = loader()
+            self.set(key, value, version=version)
+        return value
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate):
+        with self._lock:
+            stale = [key for key, (value, _) in self._entries.items() if predicate(value)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+catalog_cache = TTLCache(CATALOG_CACHE_TTL, CATALOG_CACHE_MAX_ENTRIES)
+session_cache = TTLCache(SESSION_CACHE_TTL, SESSION_CACHE_MAX_ENTRIES)
+
+# Session token prefixes tell which table a token lives in
+SESSION_PREFIXES = {'user': 'usr_', 'admin': 'adm_'}
+SESSION_TABLES = {
+    'user': ('user_sessions', 'users'),
+    'admin': ('admin_sessions', 'admin_users')
+}
+
+def parse_fields(raw, allowed, default=None):
+    """Turn a fields= parameter into a select() column list."""
+    if not raw:
+        return ','.join(sorted(default or allowed))
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    for field in CURSOR_FIELDS:
+        if field not in fields:
+            fields.append(field)
+    return ','.join(fields)
+
+def parse_page_size(raw):
+    if raw is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(raw)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if size < 1:
+        raise ValueError('limit must be positive')
+    return min(size, MAX_PAGE_SIZE)
+
+def parse_number(raw, name):
+    if raw is None or raw == '':
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+def encode_cursor(row):
+    raw = json.dumps([row['created_at'], row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded).decode('utf-8'))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_cursor(raw):
+    if not raw:
+        return None
+    decode_cursor(raw)  # reject malformed cursors before they reach the query
+    return raw
+
+def quote_filter_value(value):
+    """Quote a value for use inside a PostgREST or=(...) expression."""
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+def apply_or_filter(query, expression):
+    # postgrest-py 0.10 has no or_() builder, so add the raw parameter
+    query.params = query.params.add('or', f'({expression})')
+    return query
+
+def apply_keyset_page(query, cursor, limit):
+    """Order newest first and continue strictly after the cursor row, using
+    the id as tie-breaker for rows sharing the same created_at."""
+    if cursor:
+        created_at, row_id = (quote_filter_value(v) for v in decode_cursor(cursor))
+        apply_or_filter(
+            query,
+            f'created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{row_id})'
+        )
+    query.params = query.params.add('order', 'created_at.desc,id.desc')
+    # One extra row tells us whether there is a next page
+    return query.limit(limit + 1)
+
+def split_page(rows, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+def parse_terrain_query(args):
+    """Normalize /api/terrains query parameters into a hashable cache key."""
+    return (
+        ('enabled_only', args.get('enabled_only', 'true').lower() == 'true'),
+        ('columns', parse_fields(args.get('fields'), TERRAIN_FIELDS, TERRAIN_DEFAULT_FIELDS)),
+        ('type', (args.get('type') or '').strip().lower() or None),
+        ('location', (args.get('location') or '').strip() or None),
+        ('min_price', parse_number(args.get('min_price'), 'min_price')),
+        ('max_price', parse_number(args.get('max_price'), 'max_price')),
+        ('min_size', parse_number(args.get('min_size'), 'min_size')),
+        ('max_size', parse_number(args.get('max_size'), 'max_size')),
+        ('cursor', parse_cursor(args.get('cursor'))),
+        ('limit', parse_page_size(args.get('limit')))
+    )
+
+def terrains_query(client, params):
+    """Build (without executing) the catalog query, so the sync client and
+    the async client in asgi.py share the same filters."""
+    params = dict(params)
+    query = client.table('terrains').select(params['columns'])
+    if params['enabled_only']:
+        query = query.eq('enabled', True)
+    # The schema has no type column; listing names carry it ("Terreno Comercial ...")
+    if params['type']:
+        query = query.ilike('name', f"%{params['type']}%")
+    if params['location']:
+        query = query.ilike('location', f"%{params['location']}%")
+    if params['min_price'] is not None:
+        query = query.gte('price', params['min_price'])
+    if params['max_price'] is not None:
+        query = query.lte('price', params['max_price'])
+    if params['min_size'] is not None:
+        query = query.gte('size_m2', params['min_size'])
+    if params['max_size'] is not None:
+        query = query.lte('size_m2', params['max_size'])
+    return apply_keyset_page(query, params['cursor'], params['limit'])
+
+def fetch_terrains(params):
+    rows = terrains_query(supabase, params).execute().data
+    return split_page(rows, dict(params)['limit'])
+
+def build_catalog_payload(terrains, next_cursor=None):
+    """Serialize the catalog once and derive its ETag so cache hits don't
+    pay for JSON encoding or hashing again. There is no Last-Modified: the
+    newest updated_at does not move when a terrain is deleted or disabled,
+    while the content hash does."""
+    body = json.dumps({
+        'success': True,
+        'terrains': terrains,
+        'next_cursor': next_cursor
+    }, separators=(',', ':'))
+    return {
+        'terrains': terrains,
+        'body': body,
+        'etag': hashlib.sha256(body.encode('utf-8')).hexdigest()
+    }
+
+def catalog_cache_control(public):
+    if public:
+        return f'public, max-age={CATALOG_MAX_AGE}, must-revalidate'
+    return 'private, no-cache'
+
+def catalog_response(payload, public=True):
+    response = Response(payload['body'], mimetype='application/json')
+    response.set_etag(payload['etag'])
+    response.headers['Cache-Control'] = catalog_cache_control(public)
+    # Answers 304 Not Modified for a matching If-None-Match
+    return response.make_conditional(request)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Generate session token
+def generate_session_token(kind='user'):
+    return SESSION_PREFIXES[kind] + secrets.token_urlsafe(32)
+
+def hash_session_token(session_token):
+    return hashlib.sha256(session_token.encode('utf-8')).hexdigest()
+
+def session_kinds(session_token):
+    for kind, prefix in SESSION_PREFIXES.items():
+        if session_token.startswith(prefix):
+            return [kind]
+    # Tokens issued before prefixes existed may live in either table
+    return ['user', 'admin']
+
+def cached_session(key):
+    cached = session_cache.get(key)
+    if cached is not None:
+        if cached['expires_at'].timestamp() > time.time():
+            return cached
+        session_cache.pop(key)
+    return None
+
+def session_query(client, kind, session_token):
+    sessions_table, principal_table = SESSION_TABLES[kind]
+    return client.table(sessions_table).select(f'*, {principal_table}(*)').eq('session_token', session_token).gt('expires_at', datetime.now().isoformat())
+
+def remember_session(key, kind, session, version):
+    _, principal_table = SESSION_TABLES[kind]
+    principal = session[principal_table]
+    principal.pop('password', None)
+    entry = {
+        'type': kind,
+        'user': principal,
+        'expires_at': parse_timestamp(session['expires_at']) or datetime.now()
+    }
+    remaining = entry['expires_at'].timestamp() - time.time()
+    if remaining > 0:
+        session_cache.set(key, entry, version=version, ttl=min(SESSION_CACHE_TTL, remaining))
+    return entry
+
+def lookup_session(session_token):
+    """Resolve a session token to {'type', 'user', 'expires_at'}, serving
+    repeat lookups from session_cache until the session expires."""
+    key = hash_session_token(session_token)
+    cached = cached_session(key)
+    if cached is not None:
+        return cached
+    
+    version = session_cache.version
+    for kind in session_kinds(session_token):
+        result = session_query(supabase, kind, session_token).execute()
+        if result.data:
+            return remember_session(key, kind, result.data[0], version)
+    
+    return None
+
+def require_admin(view):
+    """Reject the request unless it carries a live admin session token as
+    'Authorization: Bearer <token>'; the admin is exposed as g.admin."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        scheme, _, session_token = auth_header.partition(' ')
+        if scheme.lower() != 'bearer' or not session_token.strip():
+            return jsonify({'success': False, 'message': 'Authorization required'}), 401
+        
+        try:
+            session = lookup_session(session_token.strip())
+        except Exception as e:
+            print(f"Admin auth error: {e}")
+            return jsonify({'success': False, 'message': 'Internal server error'}), 500
+        
+        if not session or session['type'] != 'admin':
+            return jsonify({'success': False, 'message': 'Invalid or expired admin session'}), 401
+        
+        g.admin = session['user']
+        return view(*args, **kwargs)
+    return wrapper
+
+def forget_sessions(kind, principal_id):
+    return session_cache.discard_where(
+        lambda entry: entry['type'] == kind and entry['user'].get('id') == principal_id
+    )
+
 # Get all users (admin only)
 @app.route('/api/admin/users', methods=['GET'])
+@require_admin
 def get_all_users():
     try:
-        # Verify admin session (simplified for demo)
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'success': False, 'message': 'Authorization required'}), 401
-        
-        result = supabase.table('users').select('*').order('created_at', desc=True).execute()
-        
-        # Remove passwords from response
-        users = result.data
-        for user in users:
-            user.pop('password', None)
+        try:
+            # Password hashes are never part of the selectable columns
+            columns = parse_fields(request.args.get('fields'), USER_FIELDS)
+            limit = parse_page_size(request.args.get('limit'))
+            query = apply_keyset_page(
+                supabase.table('users').select(columns),
+                request.args.get('cursor'),
+                limit
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        users, next_cursor = split_page(query.execute().data, limit)
         
         return jsonify({
             'success': True,
-            'users': users
+            'users': users,
+            'next_cursor': next_cursor
         })
         
     except Exception as e:
@@ -61,14 +459,12 @@ def get_all_users():
 
 # Delete user (admin only)
 @app.route('/api/admin/users/<user_id>', methods=['DELETE'])
+@require_admin
 def delete_user(user_id):
     try:
-        # Verify admin session (simplified for demo)
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'success': False, 'message': 'Authorization required'}), 401
-        
         result = supabase.table('users').delete().eq('id', user_id).execute()
+        # Sessions are removed by ON DELETE CASCADE; drop cached copies too
+        forget_sessions('user', user_id)
         
         return jsonify({
             'success': True,
@@ -83,18 +479,20 @@ def delete_user(user_id):
 @app.route('/api/terrains', methods=['GET'])
 def get_terrains():
     try:
+        try:
+            params = parse_terrain_query(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
         # Get enabled terrains only for public access
-        enabled_only = request.args.get('enabled_only', 'true').lower() == 'true'
+        enabled_only = dict(params)['enabled_only']
         
-        if enabled_only:
-            result = supabase.table('terrains').select('*').eq('enabled', True).order('created_at', desc=True).execute()
-        else:
-            result = supabase.table('terrains').select('*').order('created_at', desc=True).execute()
+        payload = catalog_cache.get_or_load(
+            ('terrains',) + params,
+            lambda: build_catalog_payload(*fetch_terrains(params))
+        )
         
-        return jsonify({
-            'success': True,
-            'terrains': result.data
-        })
+        return catalog_response(payload, public=enabled_only)
         
     except Exception as e:
         print(f"Get terrains error: {e}")
@@ -102,13 +500,9 @@ def get_terrains():
 
 # Create new terrain (admin only)
 @app.route('/api/admin/terrains', methods=['POST'])
+@require_admin
 def create_terrain():
     try:
-        # Verify admin session (simplified for demo)
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'success': False, 'message': 'Authorization required'}), 401
-        
         data = request.get_json()
         
         # Create terrain data
@@ -130,6 +524,8 @@ def create_terrain():
         }
         
         result = supabase.table('terrains').insert(terrain_data).execute()
+        catalog_cache.invalidate()
+        schedule_catalog_sync()
         
         return jsonify({
             'success': True,
@@ -143,16 +539,14 @@ def create_terrain():
 
 # Update terrain (admin only)
 @app.route('/api/admin/terrains/<terrain_id>', methods=['PUT'])
+@require_admin
 def update_terrain(terrain_id):
     try:
-        # Verify admin session (simplified for demo)
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'success': False, 'message': 'Authorization required'}), 401
-        
         data = request.get_json()
         
         result = supabase.table('terrains').update(data).eq('id', terrain_id).execute()
+        catalog_cache.invalidate()
+        schedule_catalog_sync()
         
         return jsonify({
             'success': True,
@@ -166,13 +560,9 @@ def update_terrain(terrain_id):
 
 # Toggle terrain status (admin only)
 @app.route('/api/admin/terrains/<terrain_id>/toggle', methods=['POST'])
+@require_admin
 def toggle_terrain_status(terrain_id):
     try:
-        # Verify admin session (simplified for demo)
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'success': False, 'message': 'Authorization required'}), 401
-        
         # Get current terrain
         terrain_result = supabase.table('terrains').select('enabled').eq('id', terrain_id).execute()
         
@@ -184,6 +574,8 @@ def toggle_terrain_status(terrain_id):
         
         # Update terrain status
         result = supabase.table('terrains').update({'enabled': new_status}).eq('id', terrain_id).execute()
+        catalog_cache.invalidate()
+        schedule_catalog_sync()
         
         return jsonify({
             'success': True,
@@ -197,14 +589,12 @@ def toggle_terrain_status(terrain_id):
 
 # Delete terrain (admin only)
 @app.route('/api/admin/terrains/<terrain_id>', methods=['DELETE'])
+@require_admin
 def delete_terrain(terrain_id):
     try:
-        # Verify admin session (simplified for demo)
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return jsonify({'success': False, 'message': 'Authorization required'}), 401
-        
         result = supabase.table('terrains').delete().eq('id', terrain_id).execute()
+        catalog_cache.invalidate()
+        schedule_catalog_sync()
         
         return jsonify({
             'success': True,
@@ -215,33 +605,6 @@ def delete_terrain(terrain_id):
         print(f"Delete terrain error: {e}")
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
-@app.route('/api/terrains', methods=['POST'])
-def create_terrain():
-    """Create a new terrain"""
-    try:
-        terrains = load_terrains()
-        terrain_data = request.json
-        
-        # Generate new ID
-        max_id = max([t['id'] for t in terrains]) if terrains else 0
-        terrain_data['id'] = max_id + 1
-        
-        # Add default values
-        terrain_data.setdefault('availability', 'Disponible inmediatamente')
-        terrain_data.setdefault('coordinates', '19.4326, -99.1332')
-        terrain_data.setdefault('detailPage', f'terreno{terrain_data["id"]}.html')
-        terrain_data.setdefault('mainImage', '../img/default.jpg')
-        terrain_data.setdefault('thumbnails', ['../img/default.jpg'])
-        terrain_data.setdefault('features', [])
-        
-        terrains.append(terrain_data)
-        save_terrains(terrains)
-        
-        return jsonify({'success': True, 'message': 'Terreno creado correctamente', 'terrain': terrain_data})
-    
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
 # Contact form endpoint
 @app.route('/api/contact', methods=['POST'])
 def contact_form():
@@ -299,41 +662,250 @@ def terrain_notification_signup():
             'message': 'Error al registrar notificación. Por favor intenta de nuevo.'
         }), 500
 
+# Shared chatbot backend; conversation context lives in its per-session LRU,
+# and its knowledge base reloads from the snapshot the catalog sync publishes
+chatbot_backend = TerrenosChatbotBackend(
+    db_path=CHATBOT_DB_PATH,
+    catalog_source=os.path.join(CATALOG_SNAPSHOT_DIR, 'terrains.json'),
+    max_sessions=CHATBOT_MAX_SESSIONS,
+    session_idle_ttl=CHATBOT_SESSION_IDLE_TTL
+)
+atexit.register(chatbot_backend.close)
+
+def parse_chat_request(data):
+    message = (data.get('message') or '').strip()
+    if not message:
+        raise ValueError('Message is required')
+    if len(message) > CHATBOT_MAX_MESSAGE_LENGTH:
+        raise ValueError('Message is too long')
+    session_id = data.get('session_id') or uuid.uuid4().hex
+    if not isinstance(session_id, str) or len(session_id) > 128:
+        raise ValueError('Invalid session_id')
+    return message, session_id
+
+# Chatbot message endpoint
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            message, session_id = parse_chat_request(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        response = chatbot_backend.process_message(
+            message,
+            session_id=session_id,
+            user_ip=request.remote_addr,
+            page_url=data.get('page_url') or request.referrer
+        )
+        
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'response': response
+        })
+        
+    except Exception as e:
+        print(f"Chat error: {e}")
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Streaming chatbot endpoint (Server-Sent Events); GET serves EventSource clients
+@app.route('/api/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    try:
+        data = request.args if request.method == 'GET' else (request.get_json(silent=True) or {})
+        try:
+            message, session_id = parse_chat_request(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        chunks = chatbot_backend.stream_message(
+            message,
+            session_id=session_id,
+            user_ip=request.remote_addr,
+            page_url=data.get('page_url') or request.referrer
+        )
+        
+        def generate():
+            yield sse_event('session', {'session_id': session_id})
+            try:
+                for chunk in chunks:
+                    yield sse_event('chunk', {'text': chunk})
+                yield sse_event('done', {'success': True})
+            except Exception as e:
+                print(f"Chat stream error: {e}")
+                yield sse_event('error', {'success': False, 'message': 'Internal server error'})
+            finally:
+                chunks.close()
+        
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # Keep reverse proxies from buffering the stream
+            'X-Accel-Buffering': 'no'
+        })
+        
+    except Exception as e:
+        print(f"Chat stream error: {e}")
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+# Chatbot conversation history
+@app.route('/api/chat/<session_id>/history', methods=['GET'])
+def chat_history(session_id):
+    try:
+        try:
+            limit = parse_page_size(request.args.get('limit'))
+            page = chatbot_backend.get_conversation_history_page(
+                session_id, limit, request.args.get('cursor') or None
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'messages': page['messages'],
+            'next_cursor': page['next_cursor']
+        })
+        
+    except Exception as e:
+        print(f"Chat history error: {e}")
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+class UploadRequest(Request):
+    """Streams files posted to /api/upload straight into UPLOAD_FOLDER as
+    the multipart body is parsed, instead of spooling them in memory"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint != 'upload_file':
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        part = tempfile.NamedTemporaryFile('wb+', dir=UPLOAD_FOLDER, prefix='.upload-', suffix='.part', delete=False)
+        # Tracked so the view can remove parts it did not keep, even when
+        # parsing fails midway
+        self.__dict__.setdefault('upload_parts', []).append(part.name)
+        return part
+
+app.request_class = UploadRequest
+
+# Per-file validation, hashing and thumbnails run concurrently; hashlib and
+# Pillow release the GIL on large buffers
+upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+
+class UploadRejected(Exception):
+    pass
+
+def sniff_image_type(header):
+    """Image type from the file's magic bytes, or None"""
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def create_thumbnail(path):
+    """Write a thumbnail next to path; None when Pillow is not installed"""
+    if Image is None:
+        return None
+    name, ext = os.path.splitext(path)
+    thumbnail_path = f"{name}_thumb{ext}"
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            image.save(thumbnail_path, format=image_format)
+    except Exception as e:
+        raise UploadRejected(f'Imagen dañada o no soportada: {e}')
+    return thumbnail_path
+
+def process_upload(part_path, filename):
+    """Validate, hash, store and thumbnail one streamed file"""
+    size = os.path.getsize(part_path)
+    if size == 0:
+        raise UploadRejected('Archivo vacío')
+    if size > MAX_FILE_SIZE:
+        raise UploadRejected('Archivo demasiado grande')
+    
+    name, ext = os.path.splitext(filename)
+    expected = 'jpeg' if ext.lower() in ('.jpg', '.jpeg') else ext.lower().lstrip('.')
+    digest = hashlib.sha256()
+    with open(part_path, 'rb') as f:
+        header = f.read(16)
+        if sniff_image_type(header) != expected:
+            raise UploadRejected('El contenido no corresponde al tipo de imagen')
+        digest.update(header)
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    
+    # Generate unique filename
+    unique_filename = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
+    file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
+    os.replace(part_path, file_path)
+    try:
+        thumbnail_path = create_thumbnail(file_path)
+    except UploadRejected:
+        os.unlink(file_path)
+        raise
+    
+    return {
+        'original_name': filename,
+        'saved_name': unique_filename,
+        'path': f'uploads/{unique_filename}',
+        'thumbnail': f'uploads/{os.path.basename(thumbnail_path)}' if thumbnail_path else None,
+        'size': size,
+        'sha256': digest.hexdigest()
+    }
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Upload image files"""
     try:
-        if 'files' not in request.files:
-            return jsonify({'success': False, 'message': 'No se encontraron archivos'}), 400
-        
         files = request.files.getlist('files')
-        uploaded_files = []
         
+        if not files:
+            return jsonify({'success': False, 'message': 'No se encontraron archivos'}), 400
+        
+        jobs = []
+        rejected = []
         for file in files:
-            if file and file.filename and allowed_file(file.filename):
-                # Generate unique filename
-                filename = secure_filename(file.filename)
-                name, ext = os.path.splitext(filename)
-                unique_filename = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
-                
-                # Save file
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
-                
-                uploaded_files.append({
-                    'original_name': filename,
-                    'saved_name': unique_filename,
-                    'path': f'uploads/{unique_filename}'
-                })
+            filename = secure_filename(file.filename or '')
+            if not filename or not allowed_file(filename):
+                rejected.append({'original_name': file.filename, 'message': 'Tipo de archivo no permitido'})
+                continue
+            file.stream.flush()
+            jobs.append((filename, upload_pool.submit(process_upload, file.stream.name, filename)))
+        
+        uploaded_files = []
+        for filename, future in jobs:
+            try:
+                uploaded_files.append(future.result())
+            except UploadRejected as e:
+                rejected.append({'original_name': filename, 'message': str(e)})
         
         return jsonify({
             'success': True, 
             'message': f'{len(uploaded_files)} archivo(s) subido(s) correctamente',
-            'files': uploaded_files
+            'files': uploaded_files,
+            'rejected': rejected
         })
     
     except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
+        print(f"Upload error: {e}")
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+    
+    finally:
+        # Every streamed part was either moved into place or is removed here
+        for part_path in getattr(request, 'upload_parts', []):
+            try:
+                os.unlink(part_path)
+            except FileNotFoundError:
+                pass
 
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -352,16 +924,124 @@ def login():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+class PasswordPoolBusy(Exception):
+    pass
+
+class BoundedExecutor:
+    """Thread pool that refuses work instead of queueing without bound.
+    bcrypt releases the GIL, so threads give real parallelism here."""
+
+    def __init__(self, workers, max_pending, name):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+password_pool = BoundedExecutor(BCRYPT_WORKERS, BCRYPT_MAX_PENDING, 'bcrypt')
+
+def password_pool_busy():
+    response = jsonify({'success': False, 'message': 'Server busy, please retry shortly'})
+    response.headers['Retry-After'] = str(BCRYPT_RETRY_AFTER)
+    return response, 503
+
+class LastLoginWriter:
+    """Write-behind queue for last_login. Logins within one flush window
+    are coalesced per table into a single record_last_logins() call, one
+    UPDATE that sets each id to its own login time."""
+
+    def __init__(self, interval, batch_size):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.flushed = 0
+        self.failed_flushes = 0
+        self._pending = {}  # table -> {id: iso timestamp}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+        self._thread.start()
+
+    def record(self, table, row_id, timestamp=None):
+        with self._lock:
+            self._pending.setdefault(table, {})[row_id] = timestamp or datetime.now().isoformat()
+            depth = sum(len(rows) for rows in self._pending.values())
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    def depth(self):
+        with self._lock:
+            return sum(len(rows) for rows in self._pending.values())
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for table, rows in pending.items():
+            if not rows:
+                continue
+            try:
+                # One statement per table; ids and login times are zipped in SQL
+                supabase.rpc('record_last_logins', {
+                    'target': table,
+                    'ids': list(rows),
+                    'logins': list(rows.values())
+                }).execute()
+                self.flushed += len(rows)
+            except Exception as e:
+                print(f"last_login flush error: {e}")
+                self.failed_flushes += 1
+                with self._lock:
+                    merged = self._pending.setdefault(table, {})
+                    for row_id, timestamp in rows.items():
+                        merged[row_id] = max(timestamp, merged.get(row_id, timestamp))
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'flushed': self.flushed,
+            'failed_flushes': self.failed_flushes,
+            'interval': self.interval,
+            'batch_size': self.batch_size
+        }
+
+last_login_writer = LastLoginWriter(LAST_LOGIN_FLUSH_INTERVAL, LAST_LOGIN_BATCH_SIZE)
+atexit.register(last_login_writer.stop)
+
 # Hash password helper
-def hash_password(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def _hash_password(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
 
-def verify_password(password, hashed):
+def _verify_password(password, hashed):
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-# Generate session token
-def generate_session_token():
-    return secrets.token_urlsafe(32)
+def hash_password(password):
+    return password_pool.run(_hash_password, password)
+
+def verify_password(password, hashed):
+    return password_pool.run(_verify_password, password, hashed)
 
 # User registration endpoint
 @app.route('/api/users/register', methods=['POST'])
@@ -375,13 +1055,14 @@ def register_user():
             if not data.get(field):
                 return jsonify({'success': False, 'message': f'{field} is required'}), 400
         
-        # Check if user already exists
-        existing_user = supabase.table('users').select('*').eq('email', data['email']).execute()
-        if existing_user.data:
+        # Check if user already exists (one probe for both unique columns)
+        existing = apply_or_filter(
+            supabase.table('users').select('id,email,username'),
+            f"email.eq.{quote_filter_value(data['email'])},username.eq.{quote_filter_value(data['username'])}"
+        ).execute()
+        if any(u['email'] == data['email'] for u in existing.data):
             return jsonify({'success': False, 'message': 'Email already registered'}), 400
-        
-        existing_username = supabase.table('users').select('*').eq('username', data['username']).execute()
-        if existing_username.data:
+        if existing.data:
             return jsonify({'success': False, 'message': 'Username already taken'}), 400
         
         # Create user data
@@ -403,8 +1084,16 @@ def register_user():
             'role': 'user'
         }
         
-        # Insert user into database
-        result = supabase.table('users').insert(user_data).execute()
+        # Insert user into database; the unique constraints still guard
+        # against a concurrent registration slipping past the probe above
+        try:
+            result = supabase.table('users').insert(user_data).execute()
+        except APIError as e:
+            if e.code != '23505':
+                raise
+            if 'email' in f"{e.message} {e.details}":
+                return jsonify({'success': False, 'message': 'Email already registered'}), 400
+            return jsonify({'success': False, 'message': 'Username already taken'}), 400
         
         if result.data:
             user = result.data[0]
@@ -418,6 +1107,8 @@ def register_user():
         else:
             return jsonify({'success': False, 'message': 'Registration failed'}), 500
             
+    except PasswordPoolBusy:
+        return password_pool_busy()
     except Exception as e:
         print(f"Registration error: {e}")
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
@@ -446,7 +1137,7 @@ def login_user():
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
         # Create session token
-        session_token = generate_session_token()
+        session_token = generate_session_token('user')
         expires_at = datetime.now() + timedelta(days=7)  # 7 days expiry
         
         # Store session in database
@@ -460,10 +1151,8 @@ def login_user():
         
         supabase.table('user_sessions').insert(session_data).execute()
         
-        # Update last login
-        supabase.table('users').update({
-            'last_login': datetime.now().isoformat()
-        }).eq('id', user['id']).execute()
+        # Update last login (flushed in the background)
+        last_login_writer.record('users', user['id'])
         
         # Remove password from response
         user.pop('password', None)
@@ -475,6 +1164,8 @@ def login_user():
             'session_token': session_token
         })
         
+    except PasswordPoolBusy:
+        return password_pool_busy()
     except Exception as e:
         print(f"Login error: {e}")
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
@@ -504,7 +1195,7 @@ def admin_login():
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
         # Create session token
-        session_token = generate_session_token()
+        session_token = generate_session_token('admin')
         expires_at = datetime.now() + timedelta(hours=8)  # 8 hours expiry for admin
         
         # Store admin session
@@ -518,10 +1209,8 @@ def admin_login():
         
         supabase.table('admin_sessions').insert(session_data).execute()
         
-        # Update last login
-        supabase.table('admin_users').update({
-            'last_login': datetime.now().isoformat()
-        }).eq('id', admin['id']).execute()
+        # Update last login (flushed in the background)
+        last_login_writer.record('admin_users', admin['id'])
         
         # Remove password from response
         admin.pop('password', None)
@@ -533,6 +1222,8 @@ def admin_login():
             'session_token': session_token
         })
         
+    except PasswordPoolBusy:
+        return password_pool_busy()
     except Exception as e:
         print(f"Admin login error: {e}")
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
@@ -559,28 +1250,13 @@ def validate_session():
         if not session_token:
             return jsonify({'success': False, 'message': 'Session token required'}), 400
         
-        # Check user session
-        user_session = supabase.table('user_sessions').select('*, users(*)').eq('session_token', session_token).gt('expires_at', datetime.now().isoformat()).execute()
-        
-        if user_session.data:
-            user = user_session.data[0]['users']
-            user.pop('password', None)
-            return jsonify({
-                'success': True,
-                'user': user,
-                'type': 'user'
-            })
-        
-        # Check admin session
-        admin_session = supabase.table('admin_sessions').select('*, admin_users(*)').eq('session_token', session_token).gt('expires_at', datetime.now().isoformat()).execute()
+        session = lookup_session(session_token)
         
-        if admin_session.data:
-            admin = admin_session.data[0]['admin_users']
-            admin.pop('password', None)
+        if session:
             return jsonify({
                 'success': True,
-                'user': admin,
-                'type': 'admin'
+                'user': session['user'],
+                'type': session['type']
             })
         
         return jsonify({'success': False, 'message': 'Invalid or expired session'}), 401
@@ -589,22 +1265,102 @@ def validate_session():
         print(f"Session validation error: {e}")
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
+# Logout endpoint
+@app.route('/api/logout', methods=['POST'])
+def logout_session():
+    try:
+        data = request.get_json()
+        session_token = data.get('session_token')
+        
+        if not session_token:
+            return jsonify({'success': False, 'message': 'Session token required'}), 400
+        
+        session_cache.pop(hash_session_token(session_token))
+        for kind in session_kinds(session_token):
+            sessions_table, _ = SESSION_TABLES[kind]
+            supabase.table(sessions_table).delete().eq('session_token', session_token).execute()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Logout successful'
+        })
+        
+    except Exception as e:
+        print(f"Logout error: {e}")
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+# Publishes public/terrains.json, terrains.min.json and their .gz/.br siblings
+catalog_snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_DIR, 'terrains', CATALOG_SNAPSHOT_COMPRESS)
+# Publishes public/terrains/index.json (listing cards) and public/terrains/<id>.json
+catalog_shards = CatalogShards(os.path.join(CATALOG_SNAPSHOT_DIR, 'terrains'), CATALOG_SNAPSHOT_COMPRESS)
+# Renders public/terrenoN.html detail pages from templates/terrain_detail.html
+detail_pages = DetailPageRenderer(CATALOG_SNAPSHOT_DIR)
+
+# Published rows, kept current from the updated_at change feed and tombstones
+catalog_state = CatalogState(CATALOG_SYNC_OVERLAP)
+catalog_sync_lock = threading.Lock()
+catalog_sync_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-sync')
+catalog_sync_pending = threading.Event()
+
+def sync_catalog_snapshot(full=False):
+    """Merge terrains changed since the last sync into the published
+    snapshot. The first sync in a process, or full=True, exports every
+    enabled terrain instead."""
+    with catalog_sync_lock:
+        since = catalog_state.since()
+        if full or since is None:
+            rows = supabase.table('terrains').select('*').eq('enabled', True).execute().data
+            latest = supabase.table('terrain_tombstones').select('deleted_at').order('deleted_at', desc=True).limit(1).execute().data
+            catalog_state.reset(rows, parse_timestamp(latest[0]['deleted_at']) if latest else None)
+            changed = True
+        else:
+            since = since.isoformat()
+            rows = supabase.table('terrains').select('*').gte('updated_at', since).execute().data
+            tombstones = supabase.table('terrain_tombstones').select('terrain_id, deleted_at').gte('deleted_at', since).execute().data
+            changed = catalog_state.apply(rows, tombstones)
+        
+        # Never publish an empty catalog over the site's listings
+        if changed and len(catalog_state):
+            # Atomically replace the JSON files, unless the content is unchanged
+            rows = catalog_state.rows()
+            changed = catalog_snapshot.publish(rows)['changed']
+            changed = catalog_shards.publish(rows)['changed'] or changed
+            pages = detail_pages.render(rows)
+            changed = bool(pages['written'] or pages['removed']) or changed
+        
+        return {'changed': changed, 'count': len(catalog_state), 'sha256': catalog_snapshot.digest}
+
+def run_scheduled_catalog_sync():
+    catalog_sync_pending.clear()
+    try:
+        sync_catalog_snapshot()
+    except Exception as e:
+        print(f"Catalog sync error: {e}")
+
+def schedule_catalog_sync():
+    """Queue an incremental sync after an admin write; writes that land
+    while one is queued share it"""
+    if not CATALOG_SYNC_ON_WRITE or catalog_sync_pending.is_set():
+        return
+    catalog_sync_pending.set()
+    catalog_sync_pool.submit(run_scheduled_catalog_sync)
+
 # Sync terrains to JSON file (for real-time updates)
 @app.route('/api/admin/sync-terrains', methods=['POST'])
+@require_admin
 def sync_terrains():
     try:
-        # Get all enabled terrains from database
-        result = supabase.table('terrains').select('*').eq('enabled', True).order('created_at', desc=True).execute()
+        # Bypass the cache; ?full=true re-exports the whole catalog
+        catalog_cache.invalidate()
+        snapshot = sync_catalog_snapshot(full=request.args.get('full', 'false').lower() == 'true')
         
-        if result.data:
-            # Update the JSON file
-            with open('public/terrains.json', 'w', encoding='utf-8') as f:
-                json.dump(result.data, f, ensure_ascii=False, indent=2)
-            
+        if snapshot['count']:
             return jsonify({
                 'success': True,
-                'message': 'Terrains synced successfully',
-                'count': len(result.data)
+                'message': 'Terrains synced successfully' if snapshot['changed'] else 'Terrains already up to date',
+                'count': snapshot['count'],
+                'changed': snapshot['changed'],
+                'sha256': snapshot['sha256']
             })
         else:
             return jsonify({'success': False, 'message': 'No terrains found'}), 404
@@ -613,8 +1369,22 @@ def sync_terrains():
         print(f"Sync terrains error: {e}")
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
+# Catalog cache statistics (admin only)
+@app.route('/api/admin/cache/stats', methods=['GET'])
+@require_admin
+def catalog_cache_stats():
+    return jsonify({
+        'success': True,
+        'catalog': catalog_cache.stats(),
+        'sessions': session_cache.stats(),
+        'last_login_queue': last_login_writer.stats(),
+        'chat_sessions': chatbot_backend.sessions.stats(),
+        'chat_log_queue': chatbot_backend.log_writer.stats()
+    })
+
 # Auto Git push endpoint
 @app.route('/api/admin/git-push', methods=['POST'])
+@require_admin
 def git_push():
     try:
         data = request.get_json()
@@ -656,8 +1426,4 @@ def git_push():
         }), 500
 
 if __name__ == '__main__':
-    # Create upload directory if it doesn't exist
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
-    
     app.run(debug=True, host='0.0.0.0', port=5000)
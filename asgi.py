@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for Terrenos Premium
+Serves the hottest read endpoints with async handlers that share one pooled
+keep-alive HTTP client to Supabase; every other route is handled by the Flask
+app from app.py.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import httpx
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from postgrest import AsyncPostgrestClient
+from postgrest.utils import AsyncClient
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags, quote_etag
+
+from app import (
+    app,
+    supabase_url,
+    supabase_key,
+    catalog_cache,
+    session_cache,
+    parse_terrain_query,
+    terrains_query,
+    split_page,
+    build_catalog_payload,
+    catalog_cache_control,
+    hash_session_token,
+    cached_session,
+    session_kinds,
+    session_query,
+    remember_session
+)
+
+# Supabase connection pool configuration
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv('SUPABASE_POOL_MAX_CONNECTIONS', '200'))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv('SUPABASE_POOL_MAX_KEEPALIVE', '50'))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv('SUPABASE_HTTP_TIMEOUT', '10'))
+# Worker threads for the Flask routes; a chat stream holds one while open
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', '32'))
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    """PostgREST client whose httpx session has explicit pool limits."""
+
+    def create_session(self, base_url, headers, timeout):
+        return AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE
+            )
+        )
+
+class ThreadPoolWsgiToAsgiInstance(WsgiToAsgiInstance):
+    """Runs one WSGI request on the adapter's worker pool. asgiref runs
+    them thread_sensitive, i.e. one at a time on a single shared thread."""
+
+    _run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+    def __init__(self, wsgi_application, executor, duplicate_header_limit=100):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=self.executor)(body)
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi whose requests run concurrently on a bounded thread pool"""
+
+    def __init__(self, wsgi_application, max_workers, duplicate_header_limit=100):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        await ThreadPoolWsgiToAsgiInstance(
+            self.wsgi_application, self.executor, self.duplicate_header_limit
+        )(scope, receive, send)
+
+postgrest = None
+wsgi_app = ThreadPoolWsgiToAsgi(app, WSGI_THREADS)
+
+# Catalog loads in flight, so concurrent misses share one Supabase call
+_catalog_loads = {}
+
+def get_postgrest():
+    global postgrest
+    if postgrest is None:
+        postgrest = PooledAsyncPostgrestClient(
+            f'{supabase_url}/rest/v1',
+            headers={'apiKey': supabase_key},
+            timeout=SUPABASE_HTTP_TIMEOUT
+        )
+        postgrest.auth(supabase_key)
+    return postgrest
+
+async def close_postgrest():
+    global postgrest
+    if postgrest is not None:
+        await postgrest.aclose()
+        postgrest = None
+
+def request_headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+async def send_response(send, status, body=b'', headers=None):
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in (headers or [])]
+    # Same CORS policy as CORS(app) on the Flask side
+    headers.append((b'access-control-allow-origin', b'*'))
+    if body:
+        headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, status, data):
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    await send_response(send, status, body, [('content-type', 'application/json')])
+
+def is_not_modified(headers, payload):
+    if_none_match = headers.get('if-none-match')
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(payload['etag'])
+    return False
+
+async def load_catalog(key, params):
+    version = catalog_cache.version
+    result = await terrains_query(get_postgrest(), params).execute()
+    payload = build_catalog_payload(*split_page(result.data, dict(params)['limit']))
+    catalog_cache.set(key, payload, version=version)
+    return payload
+
+# Get terrains data
+async def get_terrains(scope, receive, send):
+    try:
+        args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        try:
+            params = parse_terrain_query(args)
+        except ValueError as e:
+            return await send_json(send, 400, {'success': False, 'message': str(e)})
+
+        key = ('terrains',) + params
+        payload = catalog_cache.get(key)
+        if payload is None:
+            task = _catalog_loads.get(key)
+            if task is None:
+                task = asyncio.ensure_future(load_catalog(key, params))
+                _catalog_loads[key] = task
+                task.add_done_callback(lambda _: _catalog_loads.pop(key, None))
+            payload = await asyncio.shield(task)
+
+        headers = [
+            ('etag', quote_etag(payload['etag'])),
+            ('cache-control', catalog_cache_control(dict(params)['enabled_only']))
+        ]
+
+        if is_not_modified(request_headers(scope), payload):
+            return await send_response(send, 304, headers=headers)
+
+        headers.append(('content-type', 'application/json'))
+        await send_response(send, 200, payload['body'].encode('utf-8'), headers)
+
+    except Exception as e:
+        print(f"Get terrains error: {e}")
+        await send_json(send, 500, {'success': False, 'message': 'Internal server error'})
+
+# Session validation endpoint
+async def validate_session(scope, receive, send):
+    try:
+        try:
+            data = json.loads(await read_body(receive) or b'{}')
+        except ValueError:
+            return await send_json(send, 400, {'success': False, 'message': 'Invalid JSON body'})
+        session_token = data.get('session_token')
+
+        if not session_token:
+            return await send_json(send, 400, {'success': False, 'message': 'Session token required'})
+
+        key = hash_session_token(session_token)
+        session = cached_session(key)
+        if session is None:
+            version = session_cache.version
+            for kind in session_kinds(session_token):
+                result = await session_query(get_postgrest(), kind, session_token).execute()
+                if result.data:
+                    session = remember_session(key, kind, result.data[0], version)
+                    break
+
+        if session:
+            return await send_json(send, 200, {
+                'success': True,
+                'user': session['user'],
+                'type': session['type']
+            })
+
+        await send_json(send, 401, {'success': False, 'message': 'Invalid or expired session'})
+
+    except Exception as e:
+        print(f"Session validation error: {e}")
+        await send_json(send, 500, {'success': False, 'message': 'Internal server error'})
+
+ASYNC_ROUTES = {
+    ('GET', '/api/terrains'): get_terrains,
+    ('POST', '/api/validate-session'): validate_session
+}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            get_postgrest()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_postgrest()
+            wsgi_app.executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = None
+    if scope['type'] == 'http':
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        return await wsgi_app(scope, receive, send)
+    await handler(scope, receive, send)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for TerrenosChatbotBackend
+
+Replays a fixed corpus of Spanish queries covering every intent and reports
+messages/sec, per-stage timings and memory per session as JSON, so results
+can be compared across commits.
+
+Usage:
+    python chatbot/benchmark.py --output bench.json
+    python chatbot/benchmark.py --compare bench.json --max-regression 0.10
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chatbot import TerrenosChatbotBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Queries per expected intent; "general" holds messages no pattern matches
+CORPUS = {
+    "greeting": [
+        "Hola",
+        "Buenos días, ¿qué tal?",
+        "Buenas tardes",
+        "Saludos, ¿cómo está?"
+    ],
+    "property_inquiry": [
+        "¿Qué propiedades tienen disponibles?",
+        "Busco un terreno residencial para construir mi casa",
+        "Quiero comprar un terreno comercial para mi negocio",
+        "¿Tienen terrenos industriales a la venta?",
+        "Me interesa un terreno campestre de 1,000 m2",
+        "Busco un terreno de más de 2,000 metros cuadrados",
+        "Tengo un presupuesto de $2,000,000 para un terreno",
+        "¿Hay terrenos en venta por menos de 1.5 millones?"
+    ],
+    "price_inquiry": [
+        "¿Cuánto cuesta?",
+        "¿Cuál es el precio del terreno?",
+        "¿Qué valor tienen sus terrenos?",
+        "¿Cuánto tendría que pagar?"
+    ],
+    "location_inquiry": [
+        "¿Dónde está ubicado?",
+        "¿En qué zona se encuentran?",
+        "¿Cuál es la dirección de la oficina?",
+        "¿En qué región están los terrenos?"
+    ],
+    "visit_request": [
+        "Quiero agendar una visita",
+        "¿Puedo ir a conocer el terreno?",
+        "Me gustaría agendar una cita",
+        "¿Me lo pueden mostrar el sábado?"
+    ],
+    "financing_inquiry": [
+        "¿Qué opciones de financiamiento tienen?",
+        "¿Aceptan crédito hipotecario del banco?",
+        "¿De cuánto es el enganche y la mensualidad a 24 meses?",
+        "¿Puedo pagar con un préstamo bancario?"
+    ],
+    "contact_request": [
+        "¿Cuál es su teléfono de contacto?",
+        "Quiero hablar con un asesor",
+        "¿Me pueden llamar?",
+        "¿Tienen email para comunicarme?"
+    ],
+    "services_inquiry": [
+        "¿Qué servicios ofrecen?",
+        "Necesito asesoría legal",
+        "¿Ayudan con la topografía y los permisos?",
+        "Necesito apoyo con los trámites"
+    ],
+    "thanks": [
+        "Gracias",
+        "Muchas gracias por la información",
+        "Te agradezco la ayuda",
+        "Thank you"
+    ],
+    "general": [
+        "ok",
+        "Tal vez más tarde",
+        "No estoy seguro todavía",
+        "Lo voy a pensar"
+    ]
+}
+
+STAGES = ["_clean_message", "_analyze_intent", "_extract_entities",
+          "_generate_response", "_store_conversation"]
+
+def build_workload(messages: int, seed: int):
+    """Deterministic (message, session_id) sequence; sessions hold 1-8 turns"""
+    rng = random.Random(seed)
+    corpus = [query for queries in CORPUS.values() for query in queries]
+    workload = []
+    session = 0
+    while len(workload) < messages:
+        for _ in range(rng.randint(1, 8)):
+            workload.append((rng.choice(corpus), f"bench_{session}"))
+        session += 1
+    return workload[:messages]
+
+def summarize(samples_ns):
+    samples = sorted(samples_ns)
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] / 1000
+    return {
+        "mean_us": statistics.fmean(samples) / 1000,
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99)
+    }
+
+def new_backend(db_dir: str, catalog: str) -> TerrenosChatbotBackend:
+    return TerrenosChatbotBackend(
+        db_path=os.path.join(db_dir, f"bench_{time.monotonic_ns()}.db"),
+        catalog_source=catalog,
+        reload_interval=float("inf")
+    )
+
+def check_corpus(backend: TerrenosChatbotBackend):
+    """Intents the classifier assigns differently from the corpus labels"""
+    mismatches = []
+    for expected, queries in CORPUS.items():
+        for query in queries:
+            intent, _ = backend._analyze_intent(backend._clean_message(query))
+            if intent != expected:
+                mismatches.append({"query": query, "expected": expected, "actual": intent})
+    return mismatches
+
+def bench_throughput(backend: TerrenosChatbotBackend, workload):
+    """End-to-end process_message rate, including draining the log queue"""
+    start = time.perf_counter()
+    for message, session_id in workload:
+        backend.process_message(message, session_id=session_id)
+    backend.log_writer.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        "messages": len(workload),
+        "seconds": elapsed,
+        "messages_per_sec": len(workload) / elapsed
+    }
+
+def bench_stages(backend: TerrenosChatbotBackend, workload):
+    """Time each pipeline stage on its own. _analyze_intent includes entity
+    extraction, which is also timed separately as _extract_entities."""
+    samples = {stage: [] for stage in STAGES}
+    clock = time.perf_counter_ns
+    for message, session_id in workload:
+        t0 = clock()
+        clean_message = backend._clean_message(message)
+        t1 = clock()
+        intent, entities = backend._analyze_intent(clean_message)
+        t2 = clock()
+        backend._extract_entities(clean_message)
+        t3 = clock()
+        response = backend._generate_response(intent, entities, clean_message)
+        t4 = clock()
+        backend._store_conversation(session_id, message, response)
+        t5 = clock()
+        samples["_clean_message"].append(t1 - t0)
+        samples["_analyze_intent"].append(t2 - t1)
+        samples["_extract_entities"].append(t3 - t2)
+        samples["_generate_response"].append(t4 - t3)
+        samples["_store_conversation"].append(t5 - t4)
+    backend.log_writer.flush()
+    return {stage: summarize(values) for stage, values in samples.items()}
+
+def bench_session_memory(backend: TerrenosChatbotBackend, sessions: int):
+    """Retained bytes per in-memory session context after a few turns"""
+    queries = ["Hola", "Busco un terreno comercial", "¿Dónde está ubicado?"]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for session in range(sessions):
+        for query in queries:
+            backend.process_message(query, session_id=f"memory_{session}")
+    backend.log_writer.flush()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "sessions": sessions,
+        "turns_per_session": len(queries),
+        "bytes_per_session": retained / sessions
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run(args):
+    workload = build_workload(args.messages, args.seed)
+    with tempfile.TemporaryDirectory() as db_dir:
+        backend = new_backend(db_dir, args.catalog)
+        try:
+            mismatches = check_corpus(backend)
+            # Warm up response caches and the statement cache
+            for message, session_id in workload[:args.warmup]:
+                backend.process_message(message, session_id=session_id)
+            throughput = bench_throughput(backend, workload)
+            stages = bench_stages(backend, workload)
+        finally:
+            backend.close()
+
+        # Fresh backend so only the new sessions are measured
+        backend = new_backend(db_dir, args.catalog)
+        try:
+            memory = bench_session_memory(backend, args.sessions)
+        finally:
+            backend.close()
+
+    return {
+        "benchmark": "chatbot",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "messages": args.messages,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "sessions": args.sessions,
+            "corpus_queries": sum(len(queries) for queries in CORPUS.values()),
+            "intents": list(CORPUS)
+        },
+        "intent_mismatches": mismatches,
+        "throughput": throughput,
+        "stages": stages,
+        "memory": memory
+    }
+
+def compare(result, baseline, max_regression: float):
+    """Print relative changes; return False if throughput regressed past the limit"""
+    old = baseline["throughput"]["messages_per_sec"]
+    new = result["throughput"]["messages_per_sec"]
+    change = (new - old) / old
+    print(f"messages/sec: {old:,.0f} -> {new:,.0f} ({change:+.1%})")
+    for stage in STAGES:
+        if stage in baseline.get("stages", {}):
+            old_us = baseline["stages"][stage]["mean_us"]
+            new_us = result["stages"][stage]["mean_us"]
+            print(f"{stage}: {old_us:.2f}us -> {new_us:.2f}us ({(new_us - old_us) / old_us:+.1%})")
+    old_bytes = baseline["memory"]["bytes_per_session"]
+    new_bytes = result["memory"]["bytes_per_session"]
+    print(f"bytes/session: {old_bytes:,.0f} -> {new_bytes:,.0f}")
+    return change >= -max_regression
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TerrenosChatbotBackend")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=2000, help="sessions for the memory benchmark")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--catalog", default=os.path.join(ROOT, "public", "terrains.json"))
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed messages/sec drop versus the baseline (fraction)")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if result["intent_mismatches"]:
+        print(f"Warning: {len(result['intent_mismatches'])} corpus queries classified "
+              f"differently from their label", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            print("Throughput regression exceeds the allowed limit", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
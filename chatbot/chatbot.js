@@ -4,6 +4,10 @@ class TerrenosChatbot {
     constructor() {
         this.isOpen = false;
         this.messages = [];
+        // Set window.CHATBOT_API_URL (e.g. '' for same origin) to stream
+        // answers from the backend instead of the local knowledge base
+        this.apiUrl = typeof window.CHATBOT_API_URL === 'string' ? window.CHATBOT_API_URL : null;
+        this.sessionId = null;
         this.knowledgeBase = this.initializeKnowledgeBase();
         this.init();
     }
@@ -133,16 +137,24 @@ class TerrenosChatbot {
             input.value = '';
             
             // Process message and get response
-            setTimeout(() => {
-                const response = this.processMessage(message);
-                this.addMessage(response, 'bot');
-            }, 500);
+            this.respond(message);
         }
     }
 
     // Send quick message
     sendQuickMessage(message) {
         this.addMessage(message, 'user');
+        this.respond(message);
+    }
+
+    // Answer from the backend stream when configured, else locally
+    respond(message) {
+        if (this.apiUrl !== null) {
+            this.streamResponse(message).catch(() => {
+                this.addMessage(this.processMessage(message), 'bot');
+            });
+            return;
+        }
         
         setTimeout(() => {
             const response = this.processMessage(message);
@@ -150,6 +162,66 @@ class TerrenosChatbot {
         }, 500);
     }
 
+    // Stream a response from /api/chat/stream, rendering each chunk as it arrives
+    async streamResponse(message) {
+        const response = await fetch(`${this.apiUrl}/api/chat/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                message,
+                session_id: this.sessionId,
+                page_url: window.location.href
+            })
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`Chat stream failed: ${response.status}`);
+        }
+        
+        const messagesContainer = document.getElementById('chatbotMessages');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let content = null;
+        let entry = null;
+        let text = '';
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                const event = (rawEvent.match(/^event: (.*)$/m) || [])[1];
+                const data = JSON.parse((rawEvent.match(/^data: (.*)$/m) || [])[1] || '{}');
+                
+                if (event === 'session') {
+                    this.sessionId = data.session_id;
+                } else if (event === 'chunk') {
+                    if (content === null) {
+                        content = this.addMessage('', 'bot');
+                        content.style.whiteSpace = 'pre-line';
+                        entry = this.messages[this.messages.length - 1];
+                    }
+                    text += data.text;
+                    content.textContent = text;
+                    entry.text = text;
+                    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                } else if (event === 'error' && content === null) {
+                    throw new Error(data.message);
+                }
+            }
+        }
+        
+        if (content === null) {
+            throw new Error('Empty chat stream');
+        }
+    }
+
     // Add message to chat
     addMessage(text, sender) {
         const messagesContainer = document.getElementById('chatbotMessages');
@@ -174,6 +246,8 @@ class TerrenosChatbot {
         
         // Store message
         this.messages.push({ text, sender, timestamp: new Date() });
+        
+        return messageDiv.querySelector('.message-content');
     }
 
     // Process user message and generate response
@@ -6,23 +6,686 @@ Advanced AI-powered chatbot with natural language processing
 
 import json
 import re
+import base64
+import bisect
+import hashlib
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 import sqlite3
+from collections import OrderedDict
 import os
+import threading
+import queue
+import time
+import weakref
+
+# SQL statements are module constants so sqlite3's per-connection statement
+# cache keeps reusing the same prepared statements
+INSERT_CONVERSATION_SQL = '''
+    INSERT INTO conversations 
+    (session_id, user_message, bot_response, user_ip, page_url)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+INSERT_LEAD_SQL = '''
+    INSERT INTO leads 
+    (name, email, phone, property_interest, message)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+# History is read in keyset pages: (timestamp, id) is unique and served in
+# order by idx_conversations_session_timestamp (SQLite appends the rowid to
+# every index entry), so each page is an index range scan
+SELECT_HISTORY_PAGE_SQL = '''
+    SELECT id, user_message, bot_response, timestamp
+    FROM conversations 
+    WHERE session_id = ?
+    ORDER BY timestamp ASC, id ASC
+    LIMIT ?
+'''
+
+SELECT_HISTORY_PAGE_AFTER_SQL = '''
+    SELECT id, user_message, bot_response, timestamp
+    FROM conversations 
+    WHERE session_id = ? AND (timestamp, id) > (?, ?)
+    ORDER BY timestamp ASC, id ASC
+    LIMIT ?
+'''
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+SCHEMA_MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_conversations_session_timestamp ON conversations(session_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email)"
+    ])
+]
+
+HISTORY_PAGE_SIZE = 200
+
+# Streamed responses are cut after each paragraph
+RESPONSE_CHUNK_BOUNDARY = re.compile(r"(?<=\n\n)")
+
+# Intent patterns, in tie-break order: on equal scores the later intent wins
+INTENT_PATTERNS = {
+    "property_inquiry": [
+        r"propiedad|terreno|disponible|venta|comprar",
+        r"residencial|comercial|industrial|campestre",
+        r"casa|negocio|empresa|campo"
+    ],
+    "price_inquiry": [
+        r"precio|costo|cuesta|cuanto|cuánto|vale|valor",
+        r"pagar|dinero|inversión"
+    ],
+    "location_inquiry": [
+        r"ubicación|ubicado|ubica|donde|dónde|dirección|lugar",
+        r"zona|área|región"
+    ],
+    "visit_request": [
+        r"visita|ver|conocer|agendar|cita",
+        r"mostrar|enseñar"
+    ],
+    "financing_inquiry": [
+        r"financiamiento|crédito|préstamo",
+        r"pago|mensualidad|enganche",
+        r"banco|hipoteca"
+    ],
+    "contact_request": [
+        r"contacto|teléfono|email|llamar",
+        r"comunicar|hablar"
+    ],
+    "services_inquiry": [
+        r"servicio|asesoría|ayuda|apoyo",
+        r"legal|topografía|permiso"
+    ],
+    "greeting": [
+        r"hola|buenos|buenas|saludos",
+        r"qué tal|cómo está"
+    ],
+    "thanks": [
+        r"gracias|thank|agradezco"
+    ]
+}
+
+class IntentClassifier:
+    """Scores every intent in a single pass using one precompiled
+    alternation regex with a named group per intent"""
+    
+    def __init__(self, patterns: Dict[str, List[str]]):
+        self.intents = list(patterns)
+        self._regex = re.compile("|".join(
+            f"(?P<i{index}>{'|'.join(alternatives)})"
+            for index, alternatives in enumerate(patterns.values())
+        ))
+    
+    def scores(self, message: str) -> Dict[str, int]:
+        """Number of distinct keywords found per intent"""
+        found = {}
+        for match in self._regex.finditer(message):
+            intent = self.intents[int(match.lastgroup[1:])]
+            found.setdefault(intent, set()).add(match.group())
+        return {intent: len(keywords) for intent, keywords in found.items()}
+    
+    def classify(self, message: str) -> Tuple[str, int]:
+        """Return the highest scoring intent and its score"""
+        scores = self.scores(message)
+        if not scores:
+            return "general", 0
+        best = max(scores, key=lambda intent: (scores[intent], self.intents.index(intent)))
+        return best, scores[best]
+
+# Entity keywords: property types and price range adjectives
+PROPERTY_TYPE_KEYWORDS = {
+    "residencial": ["residencial", "casa", "hogar", "vivienda"],
+    "comercial": ["comercial", "negocio", "tienda", "oficina"],
+    "industrial": ["industrial", "fábrica", "bodega", "almacén"],
+    "campestre": ["campestre", "campo", "rural", "naturaleza"]
+}
+
+PRICE_RANGE_KEYWORDS = {
+    "low": ["barato", "económico", "bajo"],
+    "medium": ["medio", "promedio"],
+    "high": ["alto", "premium", "lujo"]
+}
+
+AMOUNT_MULTIPLIERS = {"mil": 1000, "k": 1000, "millón": 1000000, "millon": 1000000,
+                      "millones": 1000000}
+
+class EntityExtractor:
+    """Finds keywords and numeric quantities (areas, amounts, terms) in one
+    scan with a single precompiled regex; every match keeps its span"""
+    
+    def __init__(self, property_types: Dict[str, List[str]] = PROPERTY_TYPE_KEYWORDS,
+                 price_ranges: Dict[str, List[str]] = PRICE_RANGE_KEYWORDS):
+        self._keywords = {}
+        for entity_type, groups in (("property_type", property_types),
+                                    ("price_range", price_ranges)):
+            for value, keywords in groups.items():
+                for keyword in keywords:
+                    self._keywords[keyword] = (entity_type, value)
+        
+        # Longest keywords first so the alternation prefers the fuller word.
+        # Quantities share one group that starts with '$' or a digit, so the
+        # regex engine can skip ahead to candidate positions.
+        keywords = "|".join(re.escape(k) for k in sorted(self._keywords, key=len, reverse=True))
+        self._regex = re.compile(
+            r"(?P<quantity>(?P<number>[$\d](?:(?<=\$)\s?)?[\d.,]*)\s*"
+            r"(?:(?P<area_unit>m²|m2|metros cuadrados|metros|metro)"
+            r"|(?P<term_unit>meses|mes|años|año)\b"
+            r"|(?P<multiplier>millones|millón|millon|mil|k\b)?\s*(?P<currency>mxn|usd|pesos|dólares|dolares)?))"
+            rf"|(?P<keyword>{keywords})"
+        )
+    
+    @staticmethod
+    def parse_number(text: str) -> float:
+        """Parse '1,200', '1.500.000' or '2.5' with either separator style"""
+        parts = re.split(r"[.,]", text)
+        if len(parts) > 1 and all(len(p) == 3 for p in parts[1:]):
+            return float("".join(parts))
+        if len(parts) == 2:
+            return float(f"{parts[0]}.{parts[1]}")
+        return float("".join(parts))
+    
+    def _quantity(self, match) -> Optional[Tuple[str, float]]:
+        number = match.group("number")
+        digits = number.lstrip("$ ").rstrip(".,")
+        if not digits:
+            return None
+        value = self.parse_number(digits)
+        if match.group("area_unit"):
+            return "area", value
+        if match.group("term_unit"):
+            return "term_months", int(value * 12 if match.group("term_unit").startswith("añ") else value)
+        multiplier = AMOUNT_MULTIPLIERS.get(match.group("multiplier") or "", 1)
+        # A bare number is not an amount without a currency or multiplier
+        if multiplier == 1 and not (number.startswith("$") or match.group("currency")):
+            return None
+        return "amount", value * multiplier
+    
+    def scan(self, message: str) -> List[Dict]:
+        """Every entity found, in message order, with its span"""
+        matches = []
+        for match in self._regex.finditer(message):
+            if match.lastgroup == "keyword":
+                entity_type, value = self._keywords[match.group("keyword")]
+            else:
+                quantity = self._quantity(match)
+                if quantity is None:
+                    continue
+                entity_type, value = quantity
+            start, end = match.span()
+            # Optional unit groups can leave separators or spaces in the span
+            end = start + len(message[start:end].rstrip(" .,"))
+            matches.append({
+                "type": entity_type,
+                "value": value,
+                "text": message[start:end],
+                "start": start,
+                "end": end
+            })
+        return matches
+    
+    def extract(self, message: str) -> Dict:
+        """Structured entities: first value per type plus all spans"""
+        matches = self.scan(message)
+        entities = {}
+        for match in matches:
+            if match["type"] == "area":
+                entities.setdefault("desired_area", int(match["value"]))
+            elif match["type"] == "amount":
+                entities.setdefault("budget", match["value"])
+            else:
+                entities.setdefault(match["type"], match["value"])
+        if matches:
+            entities["matches"] = matches
+        return entities
+
+class PropertyIndex:
+    """Read-only indexes over the knowledge base properties: hash indexes
+    by type and status plus sorted price and area arrays for bisect range
+    queries"""
+    
+    def __init__(self, properties: List[Dict]):
+        self.properties = list(properties)
+        self.by_id = {}
+        self.by_type = {}
+        self.by_status = {}
+        for position, prop in enumerate(self.properties):
+            self.by_id[prop["id"]] = position
+            self.by_type.setdefault(prop.get("type"), []).append(position)
+            self.by_status.setdefault(prop.get("status"), []).append(position)
+        
+        price_order = sorted(range(len(self.properties)), key=lambda i: self.properties[i]["price"])
+        self._price_keys = [self.properties[i]["price"] for i in price_order]
+        self._price_ids = price_order
+        self._price_rank = {position: rank for rank, position in enumerate(price_order)}
+        
+        area_order = sorted(range(len(self.properties)), key=lambda i: self.properties[i]["area"])
+        self._area_keys = [self.properties[i]["area"] for i in area_order]
+        self._area_ids = area_order
+    
+    def __len__(self) -> int:
+        return len(self.properties)
+    
+    @staticmethod
+    def _range(keys: List, ids: List[int], low=None, high=None) -> List[int]:
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        end = len(keys) if high is None else bisect.bisect_right(keys, high)
+        return ids[start:end]
+    
+    def get(self, property_id: str) -> Optional[Dict]:
+        position = self.by_id.get(property_id)
+        return None if position is None else self.properties[position]
+    
+    def sorted_by_price(self) -> List[Dict]:
+        return [self.properties[i] for i in self._price_ids]
+    
+    def query(self, property_type: str = None, status: str = None,
+              min_price: float = None, max_price: float = None,
+              min_area: float = None, max_area: float = None) -> List[Dict]:
+        """Properties matching every given filter, cheapest first"""
+        candidates = []
+        if property_type is not None:
+            candidates.append(self.by_type.get(property_type, []))
+        if status is not None:
+            candidates.append(self.by_status.get(status, []))
+        if min_price is not None or max_price is not None:
+            candidates.append(self._range(self._price_keys, self._price_ids, min_price, max_price))
+        if min_area is not None or max_area is not None:
+            candidates.append(self._range(self._area_keys, self._area_ids, min_area, max_area))
+        
+        if not candidates:
+            return self.sorted_by_price()
+        
+        # Intersect starting from the most selective index
+        candidates.sort(key=len)
+        matches = set(candidates[0])
+        for ids in candidates[1:]:
+            if not matches:
+                break
+            matches.intersection_update(ids)
+        return [self.properties[i] for i in sorted(matches, key=self._price_rank.__getitem__)]
+
+class _ThreadConnection:
+    """Holds one thread's connection; only its thread-local refers to it"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+class SQLiteConnectionPool:
+    """One persistent connection per thread, opened in WAL mode. A
+    connection is closed when its thread exits, so servers that start a
+    thread per request do not accumulate them."""
+    
+    def __init__(self, db_path: str, timeout: float = 5.0, cached_statements: int = 64):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        # Weak, so a holder dies with its thread's locals
+        self._holders = weakref.WeakSet()
+        self._lock = threading.Lock()
+    
+    def get(self) -> sqlite3.Connection:
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False
+            )
+            # WAL lets readers proceed while a writer commits; NORMAL only
+            # syncs at checkpoints, which is safe in WAL mode
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            holder = _ThreadConnection(conn)
+            weakref.finalize(holder, conn.close)
+            self._local.holder = holder
+            with self._lock:
+                self._holders.add(holder)
+        return holder.conn
+    
+    def close(self):
+        with self._lock:
+            holders, self._holders = list(self._holders), weakref.WeakSet()
+        for holder in holders:
+            try:
+                holder.conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+class ConversationLogWriter:
+    """Background writer that batches conversation rows into one
+    executemany() transaction per batch"""
+    
+    def __init__(self, pool: SQLiteConnectionPool, batch_size: int = 100,
+                 flush_interval: float = 1.0, max_queue: int = 10000,
+                 overflow: str = "block"):
+        if overflow not in ("block", "drop"):
+            raise ValueError("overflow must be 'block' or 'drop'")
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="conversation-log-writer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, row: Tuple):
+        """Queue one row; blocks or drops it when the queue is full"""
+        if self.overflow == "drop":
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self._queue.put(row)
+    
+    def depth(self) -> int:
+        return self._queue.qsize()
+    
+    def _write(self, rows: List[Tuple]):
+        try:
+            with self._write_lock:
+                conn = self.pool.get()
+                with conn:
+                    conn.executemany(INSERT_CONVERSATION_SQL, rows)
+            self.written += len(rows)
+        except Exception as e:
+            self.failed += len(rows)
+            print(f"Error storing conversation batch: {e}")
+    
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            
+            # Collect until the batch is full, the flush interval elapses or
+            # a flush marker arrives
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    if batch:
+                        self._write(batch)
+                        batch = []
+                    item.set()
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+    
+    def flush(self):
+        """Write everything queued so far, including a batch the writer
+        thread is still collecting"""
+        if self._thread.is_alive():
+            # Rows ahead of the marker are written before it is set
+            done = threading.Event()
+            self._queue.put(done)
+            while not done.wait(0.1):
+                if not self._thread.is_alive():
+                    break
+            else:
+                return
+        
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+                else:
+                    batch.append(item)
+            if not batch:
+                return
+            self._write(batch)
+    
+    def stop(self):
+        self._stopped.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+    
+    def stats(self) -> Dict:
+        return {
+            "depth": self.depth(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+class SessionContextStore:
+    """Per-session conversation context in a bounded LRU map; sessions idle
+    for longer than idle_ttl seconds are evicted"""
+    
+    def __init__(self, max_sessions: int = 10000, idle_ttl: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def get(self, session_id: str) -> Dict:
+        """Return the session's context, creating it if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            context = self._sessions.get(session_id)
+            if context is not None and now - context["last_seen"] > self.idle_ttl:
+                del self._sessions[session_id]
+                self.evictions += 1
+                context = None
+            
+            if context is None:
+                context = {"focus": None, "last_intent": None, "turns": 0, "last_seen": now}
+                self._sessions[session_id] = context
+                self._evict(now)
+            else:
+                self._sessions.move_to_end(session_id)
+                context["last_seen"] = now
+            return context
+    
+    def _evict(self, now: float):
+        # Least recently used first, so idle sessions are always at the front
+        while self._sessions:
+            context = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - context["last_seen"] <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+    
+    def discard(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl,
+            "evictions": self.evictions
+        }
+
+def catalog_row_to_property(row: Dict) -> Dict:
+    """Convert a terrains catalog row (public/terrains.json or the Supabase
+    terrains table) into a knowledge base property"""
+    name = row.get("name") or ""
+    raw_price = row.get("price") or 0
+    if isinstance(raw_price, str):
+        digits = re.sub(r"[^\d.,]", "", raw_price)
+        price = EntityExtractor.parse_number(digits) if digits else 0.0
+        price_text = raw_price
+    else:
+        price = float(raw_price)
+        price_text = f"${price:,.0f} {row.get('currency') or 'MXN'}"
+    
+    size = row.get("size") or ""
+    area_match = re.search(r"\d[\d.,]*", size)
+    area = EntityExtractor.parse_number(area_match.group().rstrip(".,")) if area_match else 0.0
+    
+    # The catalog has no type column; infer it from the name, then description
+    property_type = "otro"
+    for text in (name.lower(), (row.get("description") or "").lower()):
+        found = [t for t, keywords in PROPERTY_TYPE_KEYWORDS.items() if any(k in text for k in keywords)]
+        if found:
+            property_type = found[0]
+            break
+    
+    row_id = row.get("id")
+    return {
+        "id": f"terreno{row_id}" if isinstance(row_id, int) else str(row_id),
+        "name": name,
+        "price": price,
+        "price_text": price_text,
+        "area": area,
+        "area_text": size,
+        "location": row.get("location") or "",
+        "type": property_type,
+        "status": "disponible" if row.get("enabled", True) else "no disponible",
+        "features": row.get("features") or [],
+        "description": row.get("description") or "",
+        "coordinates": row.get("coordinates") or "",
+        "availability": row.get("availability") or "",
+        "detail_page": row.get("detailPage") or row.get("detail_page")
+    }
 
 class TerrenosChatbotBackend:
-    def __init__(self, db_path: str = "chatbot/chatbot.db"):
+    def __init__(self, db_path: str = "chatbot/chatbot.db", log_batch_size: int = 100,
+                 log_flush_interval: float = 1.0, log_queue_size: int = 10000,
+                 log_overflow: str = "block",
+                 catalog_source: Union[str, Callable[[], List[Dict]]] = "public/terrains.json",
+                 reload_interval: float = 5.0, max_sessions: int = 10000,
+                 session_idle_ttl: float = 1800.0):
         self.db_path = db_path
+        # catalog_source is a JSON file path or a callable returning catalog
+        # rows, e.g. a Supabase query on the terrains table
+        self.catalog_source = catalog_source
+        self.reload_interval = reload_interval
+        self._catalog_signature = None
+        self._catalog_digest = None
+        self._property_cache = {}
+        self._last_reload_check = time.monotonic()
+        self._reload_lock = threading.Lock()
         self.knowledge_base = self._load_knowledge_base()
-        self.conversation_history = []
+        self.kb_version = 1
+        self._response_cache = {}
+        self.intent_classifier = IntentClassifier(INTENT_PATTERNS)
+        self.entity_extractor = EntityExtractor()
+        self.sessions = SessionContextStore(max_sessions, session_idle_ttl)
+        self.pool = SQLiteConnectionPool(db_path)
         self._init_database()
+        self.log_writer = ConversationLogWriter(
+            self.pool, log_batch_size, log_flush_interval, log_queue_size, log_overflow
+        )
+    
+    def _read_catalog(self, force: bool = False) -> Optional[List[Dict]]:
+        """Return catalog rows, or None when the source is unchanged (by
+        mtime/size for files, by content hash for both) or unreadable"""
+        try:
+            if callable(self.catalog_source):
+                rows = self.catalog_source()
+                content = json.dumps(rows, sort_keys=True, default=str).encode("utf-8")
+            else:
+                stat = os.stat(self.catalog_source)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if not force and signature == self._catalog_signature:
+                    return None
+                self._catalog_signature = signature
+                with open(self.catalog_source, "rb") as f:
+                    content = f.read()
+                rows = None
+            
+            digest = hashlib.sha256(content).hexdigest()
+            if not force and digest == self._catalog_digest:
+                return None
+            self._catalog_digest = digest
+            return rows if rows is not None else json.loads(content)
+        except Exception as e:
+            print(f"Error reading terrains catalog: {e}")
+            return None
+    
+    def _build_properties(self, rows: List[Dict]) -> List[Dict]:
+        """Convert enabled catalog rows, reusing properties whose row did not
+        change since the previous build"""
+        previous = self._property_cache
+        cache = {}
+        properties = []
+        for row in rows:
+            if not row.get("enabled", True):
+                continue
+            key = row.get("id")
+            digest = hashlib.sha256(json.dumps(row, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+            cached = previous.get(key)
+            prop = cached[1] if cached is not None and cached[0] == digest else catalog_row_to_property(row)
+            cache[key] = (digest, prop)
+            properties.append(prop)
+        self._property_cache = cache
+        return properties
+    
+    def reload_knowledge_base(self, force: bool = True) -> bool:
+        """Rebuild the knowledge base from the catalog and swap it in
+        atomically; rendered responses are invalidated. Returns whether
+        a new knowledge base was published."""
+        with self._reload_lock:
+            rows = self._read_catalog(force=force)
+            if rows is None:
+                return False
+            knowledge_base = self._build_knowledge_base(rows)
+            self._response_cache = {}
+            self.knowledge_base = knowledge_base
+            self.kb_version += 1
+            return True
+    
+    def _maybe_reload_knowledge_base(self):
+        """Check the catalog for changes at most once per reload_interval"""
+        now = time.monotonic()
+        if now - self._last_reload_check < self.reload_interval:
+            return
+        self._last_reload_check = now
+        # Another thread is already rebuilding; keep serving the current one
+        if self._reload_lock.locked():
+            return
+        self.reload_knowledge_base(force=False)
+    
+    def _cached_response(self, key: Tuple, render) -> str:
+        """Render a knowledge-base-only response once per kb_version"""
+        version = self.kb_version
+        cached = self._response_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        response = render()
+        self._response_cache[key] = (version, response)
+        return response
+    
+    def close(self):
+        """Flush pending conversation rows and close database connections"""
+        self.log_writer.stop()
+        self.pool.close()
     
     def _init_database(self):
         """Initialize SQLite database for conversation storage"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.get()
         cursor = conn.cursor()
         
         # Create conversations table
@@ -54,93 +717,30 @@ class TerrenosChatbotBackend:
         ''')
         
         conn.commit()
-        conn.close()
+        self._migrate_database(conn)
+    
+    def _migrate_database(self, conn: sqlite3.Connection):
+        """Apply schema migrations newer than the database's user_version"""
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, statements in SCHEMA_MIGRATIONS:
+            if version <= current:
+                continue
+            with conn:
+                for statement in statements:
+                    conn.execute(statement)
+                # PRAGMA does not accept bound parameters
+                conn.execute(f"PRAGMA user_version = {int(version)}")
     
     def _load_knowledge_base(self) -> Dict:
         """Load comprehensive knowledge base"""
-        return {
-            "properties": [
-                {
-                    "id": "terreno1",
-                    "name": "Terreno Residencial Las Flores",
-                    "price": 85000,
-                    "price_text": "$85,000 USD",
-                    "area": 500,
-                    "area_text": "500 m²",
-                    "location": "Zona Norte, Ciudad",
-                    "type": "residencial",
-                    "status": "disponible",
-                    "features": [
-                        "Agua potable", "Electricidad", "Drenaje", 
-                        "Pavimentación", "Seguridad 24/7", "Cerca de escuelas",
-                        "Transporte público", "Centros comerciales cercanos"
-                    ],
-                    "description": "Excelente terreno en zona residencial con todos los servicios disponibles.",
-                    "coordinates": "19.4326, -99.1332",
-                    "financing_options": ["Crédito bancario", "Pago directo", "INFONAVIT"],
-                    "legal_status": "Escrituras en regla"
-                },
-                {
-                    "id": "terreno2", 
-                    "name": "Terreno Comercial Centro",
-                    "price": 150000,
-                    "price_text": "$150,000 USD",
-                    "area": 800,
-                    "area_text": "800 m²",
-                    "location": "Centro Comercial",
-                    "type": "comercial",
-                    "status": "disponible",
-                    "features": [
-                        "Ubicación estratégica", "Alto tráfico peatonal",
-                        "Transporte público", "Zonificación comercial",
-                        "Servicios completos", "Estacionamiento cercano"
-                    ],
-                    "description": "Ideal para desarrollo comercial con alta afluencia de personas.",
-                    "coordinates": "19.4285, -99.1277",
-                    "financing_options": ["Crédito comercial", "Pago directo"],
-                    "legal_status": "Uso de suelo comercial"
-                },
-                {
-                    "id": "terreno3",
-                    "name": "Terreno Industrial El Progreso", 
-                    "price": 120000,
-                    "price_text": "$120,000 USD",
-                    "area": 1200,
-                    "area_text": "1,200 m²",
-                    "location": "Zona Industrial",
-                    "type": "industrial",
-                    "status": "disponible",
-                    "features": [
-                        "Acceso a carreteras principales", "Servicios industriales",
-                        "Zonificación industrial", "Amplio espacio",
-                        "Energía trifásica", "Agua industrial"
-                    ],
-                    "description": "Perfecto para desarrollo industrial con acceso a carreteras principales.",
-                    "coordinates": "19.3910, -99.2837",
-                    "financing_options": ["Crédito industrial", "Leasing"],
-                    "legal_status": "Zonificación industrial aprobada"
-                },
-                {
-                    "id": "terreno4",
-                    "name": "Terreno Campestre Vista Hermosa",
-                    "price": 65000,
-                    "price_text": "$65,000 USD", 
-                    "area": 2000,
-                    "area_text": "2,000 m²",
-                    "location": "Zona Rural",
-                    "type": "campestre",
-                    "status": "disponible",
-                    "features": [
-                        "Vista panorámica", "Ambiente natural", "Aire puro",
-                        "Tranquilidad", "Ideal para casa de campo",
-                        "Acceso por camino rural", "Pozo de agua"
-                    ],
-                    "description": "Hermoso terreno campestre con vista panorámica y ambiente natural.",
-                    "coordinates": "19.5126, -99.0532",
-                    "financing_options": ["Pago directo", "Planes flexibles"],
-                    "legal_status": "Escrituras en orden"
-                }
-            ],
+        return self._build_knowledge_base(self._read_catalog(force=True) or [])
+    
+    def _build_knowledge_base(self, rows: List[Dict]) -> Dict:
+        """Build a complete knowledge base from catalog rows; it is only
+        published once fully built"""
+        properties = self._build_properties(rows)
+        knowledge_base = {
+            "properties": properties,
             "company_info": {
                 "name": "Terrenos Premium",
                 "phone": "+1 234 567 8900",
@@ -186,10 +786,50 @@ class TerrenosChatbotBackend:
                 "banks": ["Banco Nacional", "Banco Comercial", "Banco Industrial"]
             }
         }
+        knowledge_base["property_index"] = PropertyIndex(knowledge_base["properties"])
+        return knowledge_base
     
     def process_message(self, message: str, session_id: str = None, 
                        user_ip: str = None, page_url: str = None) -> str:
         """Process user message and generate intelligent response"""
+        clean_message, intent, entities, response = self._route_message(message, session_id)
+        
+        # Generate response based on intent
+        if response is None:
+            response = self._generate_response(intent, entities, clean_message)
+        
+        # Store conversation
+        self._store_conversation(session_id, message, response, user_ip, page_url)
+        
+        return response
+    
+    def stream_message(self, message: str, session_id: str = None,
+                       user_ip: str = None, page_url: str = None) -> Iterator[str]:
+        """Process user message and yield the response in chunks as they are
+        produced; joined, the chunks equal process_message's response"""
+        clean_message, intent, entities, response = self._route_message(message, session_id)
+        
+        if response is None:
+            chunks = self._stream_response(intent, entities, clean_message)
+        else:
+            chunks = self._split_response(response)
+        
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            # Store what was produced, even if the client went away midway
+            self._store_conversation(session_id, message, "".join(parts), user_ip, page_url)
+    
+    def _route_message(self, message: str, session_id: Optional[str]) -> Tuple[str, str, Dict, Optional[str]]:
+        """Clean and classify a message and update the session context.
+        Returns the clean message, intent, entities and, for follow-ups
+        answered from the session context, the response."""
+        
+        # Pick up catalog edits without a restart
+        self._maybe_reload_knowledge_base()
         
         # Clean and normalize message
         clean_message = self._clean_message(message)
@@ -197,13 +837,16 @@ class TerrenosChatbotBackend:
         # Analyze intent
         intent, entities = self._analyze_intent(clean_message)
         
-        # Generate response based on intent
-        response = self._generate_response(intent, entities, clean_message)
+        # Follow-ups about the property under discussion are answered from
+        # the session context
+        context = self.sessions.get(session_id) if session_id else None
+        response = self._resolve_follow_up(context, intent, entities)
         
-        # Store conversation
-        self._store_conversation(session_id, message, response, user_ip, page_url)
+        if context is not None:
+            context["last_intent"] = intent
+            context["turns"] += 1
         
-        return response
+        return clean_message, intent, entities, response
     
     def _clean_message(self, message: str) -> str:
         """Clean and normalize user message"""
@@ -216,56 +859,7 @@ class TerrenosChatbotBackend:
     def _analyze_intent(self, message: str) -> Tuple[str, Dict]:
         """Analyze user intent and extract entities"""
         
-        # Intent patterns
-        intents = {
-            "property_inquiry": [
-                r"propiedad|terreno|disponible|venta|comprar",
-                r"residencial|comercial|industrial|campestre",
-                r"casa|negocio|empresa|campo"
-            ],
-            "price_inquiry": [
-                r"precio|costo|cuanto|vale|valor",
-                r"pagar|dinero|inversión"
-            ],
-            "location_inquiry": [
-                r"ubicación|donde|dirección|lugar",
-                r"zona|área|región"
-            ],
-            "visit_request": [
-                r"visita|ver|conocer|agendar|cita",
-                r"mostrar|enseñar"
-            ],
-            "financing_inquiry": [
-                r"financiamiento|crédito|préstamo",
-                r"pago|mensualidad|enganche",
-                r"banco|hipoteca"
-            ],
-            "contact_request": [
-                r"contacto|teléfono|email|llamar",
-                r"comunicar|hablar"
-            ],
-            "services_inquiry": [
-                r"servicio|asesoría|ayuda|apoyo",
-                r"legal|topografía|permiso"
-            ],
-            "greeting": [
-                r"hola|buenos|buenas|saludos",
-                r"qué tal|cómo está"
-            ],
-            "thanks": [
-                r"gracias|thank|agradezco"
-            ]
-        }
-        
-        # Find matching intent
-        detected_intent = "general"
-        confidence = 0
-        
-        for intent, patterns in intents.items():
-            for pattern in patterns:
-                if re.search(pattern, message):
-                    detected_intent = intent
-                    confidence += 1
+        detected_intent, confidence = self.intent_classifier.classify(message)
         
         # Extract entities
         entities = self._extract_entities(message)
@@ -274,36 +868,7 @@ class TerrenosChatbotBackend:
     
     def _extract_entities(self, message: str) -> Dict:
         """Extract entities from message"""
-        entities = {}
-        
-        # Property types
-        property_types = {
-            "residencial": ["residencial", "casa", "hogar", "vivienda"],
-            "comercial": ["comercial", "negocio", "tienda", "oficina"],
-            "industrial": ["industrial", "fábrica", "bodega", "almacén"],
-            "campestre": ["campestre", "campo", "rural", "naturaleza"]
-        }
-        
-        for prop_type, keywords in property_types.items():
-            for keyword in keywords:
-                if keyword in message:
-                    entities["property_type"] = prop_type
-                    break
-        
-        # Price ranges
-        if re.search(r"barato|económico|bajo", message):
-            entities["price_range"] = "low"
-        elif re.search(r"medio|promedio", message):
-            entities["price_range"] = "medium"
-        elif re.search(r"alto|premium|lujo", message):
-            entities["price_range"] = "high"
-        
-        # Area preferences
-        area_match = re.search(r"(\d+)\s*(m²|metros|metro)", message)
-        if area_match:
-            entities["desired_area"] = int(area_match.group(1))
-        
-        return entities
+        return self.entity_extractor.extract(message)
     
     def _generate_response(self, intent: str, entities: Dict, message: str) -> str:
         """Generate appropriate response based on intent and entities"""
@@ -311,26 +876,35 @@ class TerrenosChatbotBackend:
         if intent == "greeting":
             return self._get_greeting_response()
         
+        # Everything below except thanks/default depends only on the
+        # knowledge base, so it is rendered once per kb_version
         elif intent == "property_inquiry":
-            return self._get_property_response(entities)
+            # Budget and area are free user input; caching per value would
+            # grow without bound, so those answers are rendered each time
+            if entities.get("budget") is not None or entities.get("desired_area") is not None:
+                return self._get_property_response(entities)
+            return self._cached_response(
+                ("property", entities.get("property_type")),
+                lambda: self._get_property_response(entities)
+            )
         
         elif intent == "price_inquiry":
-            return self._get_price_response(entities)
+            return self._cached_response(("price",), lambda: self._get_price_response(entities))
         
         elif intent == "location_inquiry":
-            return self._get_location_response()
+            return self._cached_response(("location",), self._get_location_response)
         
         elif intent == "visit_request":
-            return self._get_visit_response()
+            return self._cached_response(("visit",), self._get_visit_response)
         
         elif intent == "financing_inquiry":
-            return self._get_financing_response(entities)
+            return self._cached_response(("financing",), lambda: self._get_financing_response(entities))
         
         elif intent == "contact_request":
-            return self._get_contact_response()
+            return self._cached_response(("contact",), self._get_contact_response)
         
         elif intent == "services_inquiry":
-            return self._get_services_response()
+            return self._cached_response(("services",), self._get_services_response)
         
         elif intent == "thanks":
             return self._get_thanks_response()
@@ -338,6 +912,48 @@ class TerrenosChatbotBackend:
         else:
             return self._get_default_response()
     
+    def _stream_response(self, intent: str, entities: Dict, message: str) -> Iterator[str]:
+        """Generate the response as a stream of chunks. Responses here are
+        rendered whole and cut into paragraphs; a slower generator (e.g. a
+        language model) can override this to yield as it produces text."""
+        yield from self._split_response(self._generate_response(intent, entities, message))
+    
+    @staticmethod
+    def _split_response(response: str) -> List[str]:
+        return [chunk for chunk in RESPONSE_CHUNK_BOUNDARY.split(response) if chunk]
+    
+    def _matching_properties(self, entities: Dict) -> Optional[List[Dict]]:
+        """Properties matching the message's filters, or None without filters"""
+        filters = {
+            "property_type": entities.get("property_type"),
+            "max_price": entities.get("budget"),
+            "min_area": entities.get("desired_area")
+        }
+        if all(value is None for value in filters.values()):
+            return None
+        return self.knowledge_base["property_index"].query(**filters)
+    
+    def _resolve_follow_up(self, context: Optional[Dict], intent: str, entities: Dict) -> Optional[str]:
+        """Answer location and price questions about a single property: the
+        one this message narrows down to, else the session's focus"""
+        matches = self._matching_properties(entities)
+        prop = None
+        if matches is not None and len(matches) == 1:
+            prop = matches[0]
+        elif matches is None and context is not None and context["focus"] is not None:
+            prop = self.knowledge_base["property_index"].get(context["focus"])
+        
+        if context is not None and matches is not None:
+            context["focus"] = prop["id"] if prop is not None else None
+        
+        if prop is None or intent not in ("location_inquiry", "price_inquiry"):
+            return None
+        if intent == "location_inquiry":
+            return self._cached_response(("location", prop["id"]),
+                                         lambda: self._get_property_location_response(prop))
+        return self._cached_response(("price", prop["id"]),
+                                     lambda: self._get_property_price_response(prop))
+    
     def _get_greeting_response(self) -> str:
         greetings = [
             "¡Hola! Bienvenido a Terrenos Premium. Soy tu asistente virtual y estoy aquí para ayudarte a encontrar el terreno perfecto. ¿En qué puedo asistirte?",
@@ -350,10 +966,16 @@ class TerrenosChatbotBackend:
     def _get_property_response(self, entities: Dict) -> str:
         properties = self.knowledge_base["properties"]
         
-        # Filter by property type if specified
-        if "property_type" in entities:
-            prop_type = entities["property_type"]
-            filtered_props = [p for p in properties if p["type"] == prop_type]
+        # Filter by property type, budget and minimum area if specified
+        filtered_props = self._matching_properties(entities)
+        if filtered_props is not None:
+            if len(filtered_props) > 1:
+                response = "🔎 **Propiedades que coinciden con tu búsqueda:**\n\n"
+                for prop in filtered_props:
+                    response += f"🏠 **{prop['name']}**\n"
+                    response += f"   📍 {prop['location']} | 📐 {prop['area_text']} | 💰 {prop['price_text']}\n\n"
+                response += "¿Te gustaría más información sobre alguna de ellas o agendar una visita?"
+                return response
             
             if filtered_props:
                 prop = filtered_props[0]
@@ -382,12 +1004,10 @@ class TerrenosChatbotBackend:
         return response
     
     def _get_price_response(self, entities: Dict) -> str:
-        properties = self.knowledge_base["properties"]
-        
         response = "💰 **Lista de Precios Actualizada:**\n\n"
         
-        # Sort by price
-        sorted_props = sorted(properties, key=lambda x: x["price"])
+        # Pre-sorted by price in the property index
+        sorted_props = self.knowledge_base["property_index"].sorted_by_price()
         
         for prop in sorted_props:
             response += f"• **{prop['name']}**: {prop['price_text']} ({prop['area_text']})\n"
@@ -401,8 +1021,9 @@ class TerrenosChatbotBackend:
         return response
     
     def _get_location_response(self) -> str:
-        properties = self.knowledge_base["properties"]
-        company = self.knowledge_base["company_info"]
+        knowledge_base = self.knowledge_base
+        properties = knowledge_base["properties"]
+        company = knowledge_base["company_info"]
         
         response = "📍 **Ubicaciones de Nuestras Propiedades:**\n\n"
         
@@ -416,6 +1037,18 @@ class TerrenosChatbotBackend:
         
         return response
     
+    def _get_property_location_response(self, prop: Dict) -> str:
+        response = f"📍 El **{prop['name']}** está ubicado en **{prop['location']}**.\n"
+        if prop["coordinates"]:
+            response += f"🗺️ Coordenadas: {prop['coordinates']}\n"
+        response += "\n¿Te gustaría agendar una visita para conocerlo?"
+        return response
+    
+    def _get_property_price_response(self, prop: Dict) -> str:
+        response = f"💰 El **{prop['name']}** tiene un precio de **{prop['price_text']}** ({prop['area_text']}).\n\n"
+        response += "💳 Ofrecemos opciones de financiamiento desde 20% de enganche. ¿Te interesa conocer las opciones de pago?"
+        return response
+    
     def _get_visit_response(self) -> str:
         company = self.knowledge_base["company_info"]
         
@@ -520,37 +1153,17 @@ Podemos llamarte, enviarte información por email, o agendar una cita presencial
     def _store_conversation(self, session_id: str, user_message: str, 
                           bot_response: str, user_ip: str = None, 
                           page_url: str = None):
-        """Store conversation in database"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO conversations 
-                (session_id, user_message, bot_response, user_ip, page_url)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (session_id, user_message, bot_response, user_ip, page_url))
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Error storing conversation: {e}")
+        """Queue conversation for the background database writer"""
+        self.log_writer.submit((session_id, user_message, bot_response, user_ip, page_url))
     
     def save_lead(self, name: str, email: str, phone: str = None, 
                   property_interest: str = None, message: str = None) -> bool:
         """Save potential lead information"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO leads 
-                (name, email, phone, property_interest, message)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, email, phone, property_interest, message))
-            
-            conn.commit()
-            conn.close()
+            conn = self.pool.get()
+            with conn:
+                conn.execute(INSERT_LEAD_SQL,
+                             (name, email, phone, property_interest, message))
             return True
         except Exception as e:
             print(f"Error saving lead: {e}")
@@ -559,31 +1172,68 @@ Podemos llamarte, enviarte información por email, o agendar una cita presencial
     def get_conversation_history(self, session_id: str) -> List[Dict]:
         """Get conversation history for a session"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT user_message, bot_response, timestamp
-                FROM conversations 
-                WHERE session_id = ?
-                ORDER BY timestamp ASC
-            ''', (session_id,))
-            
-            results = cursor.fetchall()
-            conn.close()
-            
-            history = []
-            for row in results:
-                history.append({
-                    "user_message": row[0],
-                    "bot_response": row[1],
-                    "timestamp": row[2]
-                })
-            
-            return history
+            return list(self.iter_conversation_history(session_id))
         except Exception as e:
             print(f"Error getting conversation history: {e}")
             return []
+    
+    def iter_conversation_history(self, session_id: str, page_size: int = HISTORY_PAGE_SIZE,
+                                  cursor: Optional[str] = None) -> Iterator[Dict]:
+        """Stream a session's history page by page, holding one page in memory"""
+        # Make rows still sitting in the write queue visible
+        self.log_writer.flush()
+        while True:
+            page = self._fetch_history_page(session_id, page_size, cursor)
+            for _, message in page:
+                yield message
+            if len(page) < page_size:
+                return
+            cursor = self._encode_history_cursor(page[-1][0], page[-1][1]["timestamp"])
+    
+    def get_conversation_history_page(self, session_id: str, limit: int = 50,
+                                      cursor: Optional[str] = None) -> Dict:
+        """Get one page of history; pass next_cursor back to continue.
+        Raises ValueError for an invalid cursor."""
+        self.log_writer.flush()
+        # Read one extra row to know whether another page exists
+        page = self._fetch_history_page(session_id, limit + 1, cursor)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = self._encode_history_cursor(page[-1][0], page[-1][1]["timestamp"])
+        return {
+            "messages": [message for _, message in page],
+            "next_cursor": next_cursor
+        }
+    
+    def _fetch_history_page(self, session_id: str, limit: int,
+                            cursor: Optional[str]) -> List[Tuple[int, Dict]]:
+        conn = self.pool.get()
+        if cursor is None:
+            rows = conn.execute(SELECT_HISTORY_PAGE_SQL, (session_id, limit)).fetchall()
+        else:
+            timestamp, row_id = self._decode_history_cursor(cursor)
+            rows = conn.execute(SELECT_HISTORY_PAGE_AFTER_SQL,
+                                (session_id, timestamp, row_id, limit)).fetchall()
+        return [(row[0], {
+            "user_message": row[1],
+            "bot_response": row[2],
+            "timestamp": row[3]
+        }) for row in rows]
+    
+    @staticmethod
+    def _encode_history_cursor(row_id: int, timestamp: str) -> str:
+        raw = json.dumps([timestamp, row_id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+    
+    @staticmethod
+    def _decode_history_cursor(cursor: str) -> Tuple[str, int]:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded).decode("utf-8"))
+            return str(timestamp), int(row_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
 
 # Example usage and testing
 if __name__ == "__main__":
@@ -606,3 +1256,5 @@ if __name__ == "__main__":
         response = chatbot.process_message(message, session_id="test_session")
         print(f"Bot: {response}\n")
         print("-" * 50 + "\n")
+    
+    chatbot.close()
@@ -65,6 +65,25 @@ CREATE TABLE IF NOT EXISTS terrains (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Numeric size in m² parsed from the free-text size: the first number, with
+-- '.' or ',' before a group of three digits read as a thousands separator
+-- ('1,200 m²' and '1.200 m²' -> 1200, '500 m2' -> 500).
+-- Anything that does not parse yields NULL instead of failing the write.
+CREATE OR REPLACE FUNCTION parse_size_m2(size TEXT)
+RETURNS NUMERIC AS $$
+    SELECT CASE WHEN number ~ '^[0-9]+(\.[0-9]+)?$' THEN number::NUMERIC END
+    FROM (
+        SELECT replace(
+            regexp_replace(rtrim(substring(size from '[0-9][0-9.,]*'), '.,'),
+                           '[.,]([0-9]{3})(?![0-9])', '\1', 'g'),
+            ',', '.') AS number
+    ) parsed;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- size_m2 lets size range filters be pushed down into the query
+ALTER TABLE terrains ADD COLUMN IF NOT EXISTS size_m2 NUMERIC
+    GENERATED ALWAYS AS (parse_size_m2(size)) STORED;
+
 -- User sessions table for managing login sessions
 CREATE TABLE IF NOT EXISTS user_sessions (
     id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
@@ -111,11 +130,24 @@ CREATE TABLE IF NOT EXISTS terrain_notifications (
     notified_at TIMESTAMP WITH TIME ZONE
 );
 
+-- Terrains removed from the public catalog (deleted or disabled), read by
+-- the incremental catalog sync alongside rows changed since its watermark
+CREATE TABLE IF NOT EXISTS terrain_tombstones (
+    terrain_id UUID PRIMARY KEY,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_admin_users_username ON admin_users(username);
 CREATE INDEX IF NOT EXISTS idx_terrains_enabled ON terrains(enabled);
+CREATE INDEX IF NOT EXISTS idx_terrains_created_at_id ON terrains(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_terrains_price ON terrains(price);
+CREATE INDEX IF NOT EXISTS idx_terrains_size_m2 ON terrains(size_m2);
+CREATE INDEX IF NOT EXISTS idx_terrains_updated_at ON terrains(updated_at);
+CREATE INDEX IF NOT EXISTS idx_terrain_tombstones_deleted_at ON terrain_tombstones(deleted_at);
+CREATE INDEX IF NOT EXISTS idx_users_created_at_id ON users(created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_user_sessions_token ON user_sessions(session_token);
 CREATE INDEX IF NOT EXISTS idx_admin_sessions_token ON admin_sessions(session_token);
 CREATE INDEX IF NOT EXISTS idx_contact_submissions_status ON contact_submissions(status);
@@ -139,6 +171,42 @@ CREATE TRIGGER update_admin_users_updated_at BEFORE UPDATE ON admin_users
 CREATE TRIGGER update_terrains_updated_at BEFORE UPDATE ON terrains
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Set last_login for a batch of logins in one statement, each id to its own
+-- time; called by the app's write-behind queue. Runs with the caller's
+-- rights, so it allows nothing a direct UPDATE would not.
+CREATE OR REPLACE FUNCTION record_last_logins(target TEXT, ids UUID[], logins TIMESTAMPTZ[])
+RETURNS VOID AS $$
+BEGIN
+    IF target NOT IN ('users', 'admin_users') THEN
+        RAISE EXCEPTION 'record_last_logins: unsupported table %', target;
+    END IF;
+    EXECUTE format(
+        'UPDATE %I AS t SET last_login = v.login FROM unnest($1, $2) AS v(id, login) WHERE t.id = v.id',
+        target
+    ) USING ids, logins;
+END;
+$$ language 'plpgsql';
+
+-- Record tombstones when terrains are deleted or disabled. Runs as the
+-- owner, since clients can only read terrain_tombstones
+CREATE OR REPLACE FUNCTION record_terrain_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR NEW.enabled = false THEN
+        INSERT INTO terrain_tombstones (terrain_id, deleted_at)
+        VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END, NOW())
+        ON CONFLICT (terrain_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    ELSE
+        -- Re-enabled: the row itself comes back through updated_at
+        DELETE FROM terrain_tombstones WHERE terrain_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+CREATE TRIGGER record_terrains_tombstone AFTER UPDATE OF enabled OR DELETE ON terrains
+    FOR EACH ROW EXECUTE FUNCTION record_terrain_tombstone();
+
 -- Insert default admin user (password should be hashed in production)
 INSERT INTO admin_users (username, password, email, full_name, permissions) 
 VALUES (
@@ -155,6 +223,7 @@ ALTER TABLE admin_users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE terrains ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE admin_sessions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE terrain_tombstones ENABLE ROW LEVEL SECURITY;
 
 -- Users can only see their own data
 CREATE POLICY "Users can view own profile" ON users FOR SELECT USING (auth.uid() = id);
@@ -171,6 +240,9 @@ CREATE POLICY "Admins can view all users" ON users FOR ALL USING (
 -- Public can view enabled terrains
 CREATE POLICY "Anyone can view enabled terrains" ON terrains FOR SELECT USING (enabled = true);
 
+-- Public can read tombstones; only the record_terrain_tombstone trigger writes them
+CREATE POLICY "Anyone can view terrain tombstones" ON terrain_tombstones FOR SELECT USING (true);
+
 -- Admins can manage all terrains
 CREATE POLICY "Admins can manage terrains" ON terrains FOR ALL USING (
     EXISTS (
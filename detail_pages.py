@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Static detail page generator for Terrenos Premium
+Renders public/terrenoN.html for every terrain in the catalog from
+templates/terrain_detail.html. Each page records the sha256 of its render
+inputs, so only pages whose terrain (or similar-property cards, or the
+template) changed are rendered again; pages are written atomically.
+
+Run with:
+    python detail_pages.py [--catalog public/terrains.json] [--output public]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from snapshot import atomic_write
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Detail page file names the generator may write or remove
+PAGE_NAME = re.compile(r'^[A-Za-z0-9_-]+\.html$')
+# Written on the second line of every generated page
+DIGEST_MARKER = re.compile(rb'<!-- Generated by detail_pages\.py .*? sha256:([0-9a-f]{64}) -->')
+
+THUMBNAIL_ALTS = ['Vista principal', 'Vista lateral', 'Vista aérea']
+SIMILAR_COUNT = 2
+
+def field(row, camel, snake):
+    value = row.get(camel)
+    return row.get(snake) if value is None else value
+
+def page_name(row):
+    """The row's detailPage when it is a safe file name, else terreno<id>.html"""
+    name = field(row, 'detailPage', 'detail_page')
+    if isinstance(name, str) and PAGE_NAME.match(name):
+        return name
+    return f"terreno{row.get('id')}.html"
+
+def format_price(row):
+    price = row.get('price')
+    if isinstance(price, (int, float)):
+        return f"${price:,.0f} {row.get('currency') or 'MXN'}"
+    return price or ''
+
+def page_context(row):
+    main_image = field(row, 'mainImage', 'main_image') or ''
+    thumbnails = field(row, 'thumbnails', 'thumbnails') or ([main_image] if main_image else [])
+    description = row.get('description') or ''
+    return {
+        'name': row.get('name') or '',
+        'price': format_price(row),
+        'badge': row.get('badge'),
+        'location': row.get('location') or '',
+        'size': row.get('size') or '',
+        'availability': row.get('availability') or 'Disponible inmediatamente',
+        'paragraphs': [paragraph.strip() for paragraph in re.split(r'\n\s*\n', description) if paragraph.strip()],
+        'features': row.get('features') or [],
+        'main_image': main_image,
+        'thumbnails': [
+            {'src': src, 'alt': THUMBNAIL_ALTS[i] if i < len(THUMBNAIL_ALTS) else f'Vista {i + 1}'}
+            for i, src in enumerate(thumbnails)
+        ],
+        'coordinates': row.get('coordinates') or ''
+    }
+
+def similar_cards(rows, position):
+    """Cards for the next terrains in catalog order, wrapping around"""
+    others = rows[position + 1:] + rows[:position]
+    return [{
+        'name': row.get('name') or '',
+        'price': format_price(row),
+        'main_image': field(row, 'mainImage', 'main_image') or '',
+        'detail_page': page_name(row)
+    } for row in others[:SIMILAR_COUNT]]
+
+def read_digest(path):
+    """The digest recorded in a generated page, or None for any other file"""
+    try:
+        with open(path, 'rb') as f:
+            match = DIGEST_MARKER.search(f.read(512))
+    except OSError:
+        return None
+    return match.group(1).decode('ascii') if match else None
+
+class DetailPageRenderer:
+    """Renders one static detail page per terrain, skipping pages whose
+    render inputs are unchanged and removing generated pages of terrains
+    that left the catalog. Hand-written pages (files without the generator
+    marker) are never overwritten or removed."""
+
+    def __init__(self, output_dir='public', template='terrain_detail.html',
+                 template_dir=os.path.join(ROOT, 'templates')):
+        self.output_dir = output_dir
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(['html']),
+            keep_trailing_newline=True
+        )
+        self.template = self.env.get_template(template)
+        source, _, _ = self.env.loader.get_source(self.env, template)
+        self.template_digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        self._pages = None
+        self._lock = threading.Lock()
+
+    def _generated_pages(self):
+        """Generated pages already on disk, for the first render in a process"""
+        try:
+            names = [name for name in os.listdir(self.output_dir) if PAGE_NAME.match(name)]
+        except FileNotFoundError:
+            return {}
+        pages = {}
+        for name in names:
+            digest = read_digest(os.path.join(self.output_dir, name))
+            if digest is not None:
+                pages[name] = digest
+        return pages
+
+    def render(self, rows):
+        """Render pages for rows; returns the pages written and removed and
+        how many were unchanged"""
+        with self._lock:
+            previous = self._pages if self._pages is not None else self._generated_pages()
+            pages = {}
+            written = []
+            unchanged = 0
+            for position, row in enumerate(rows):
+                name = page_name(row)
+                if name in pages:
+                    print(f"Skipping duplicate detail page {name} for terrain {row.get('id')}")
+                    continue
+                path = os.path.join(self.output_dir, name)
+                if name not in previous and os.path.exists(path) and read_digest(path) is None:
+                    print(f"Skipping detail page {name} for terrain {row.get('id')}: hand-written page")
+                    continue
+                context = {'terrain': page_context(row), 'similar': similar_cards(rows, position)}
+                digest = hashlib.sha256(json.dumps(
+                    [self.template_digest, context], sort_keys=True, ensure_ascii=False
+                ).encode('utf-8')).hexdigest()
+                pages[name] = digest
+
+                if previous.get(name) == digest and os.path.exists(path):
+                    unchanged += 1
+                    continue
+                html = self.template.render(digest=digest, **context)
+                atomic_write(path, html.encode('utf-8'))
+                written.append(path)
+
+            removed = []
+            for name in set(previous) - set(pages):
+                path = os.path.join(self.output_dir, name)
+                # Only pages this generator wrote
+                if read_digest(path) is not None:
+                    os.unlink(path)
+                    removed.append(path)
+            self._pages = pages
+
+            return {'written': written, 'removed': removed, 'unchanged': unchanged}
+
+def main():
+    parser = argparse.ArgumentParser(description='Render static terrain detail pages')
+    parser.add_argument('--catalog', default=os.path.join(ROOT, 'public', 'terrains.json'))
+    parser.add_argument('--output', default=os.path.join(ROOT, 'public'))
+    args = parser.parse_args()
+
+    with open(args.catalog, encoding='utf-8') as f:
+        rows = [row for row in json.load(f) if row.get('enabled', True)]
+
+    result = DetailPageRenderer(args.output).render(rows)
+    for path in result['written']:
+        print(f"Rendered {path}")
+    for path in result['removed']:
+        print(f"Removed {path}")
+    print(f"{len(result['written'])} rendered, {len(result['removed'])} removed, {result['unchanged']} unchanged")
+
+if __name__ == '__main__':
+    main()
@@ -327,6 +327,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Load terrains from API
 async function loadTerrains() {
+    // Only the home page has a listing grid to fill
+    if (!document.querySelector('.properties-grid')) return;
+    
     try {
         // First try to load from localStorage (admin changes)
         const localTerrains = localStorage.getItem('terrains');
@@ -346,9 +349,20 @@ async function loadTerrains() {
     }
 }
 
+// Card-only index published by the catalog sync; the full catalog is the
+// fallback until the first sync has run
+const TERRAINS_INDEX_URL = 'public/terrains/index.json';
+const TERRAINS_CATALOG_URL = 'public/terrains.json';
+
+let properties = [];
+// Static cards in index.html, captured before the first render so listings
+// that are not in the catalog yet keep their card
+let staticCards = null;
+
 // Fallback function to load from JSON file
 function loadTerrainsFromJSON() {
-    fetch('public/terrains.json')
+    fetch(TERRAINS_INDEX_URL)
+        .then(response => response.ok ? response : fetch(TERRAINS_CATALOG_URL))
         .then(response => response.json())
         .then(data => {
             properties = data.filter(terrain => terrain.enabled !== false);
@@ -358,6 +372,68 @@ function loadTerrainsFromJSON() {
         .catch(error => console.error('Error fetching properties from JSON:', error));
 }
 
+function escapeHTML(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : String(value);
+    return div.innerHTML;
+}
+
+function formatPrice(terrain) {
+    if (typeof terrain.price === 'number') {
+        return `$${terrain.price.toLocaleString('en-US')} ${terrain.currency || 'MXN'}`;
+    }
+    return terrain.price || '';
+}
+
+// Catalog image paths are relative to public/, where the detail pages live
+function publicURL(path) {
+    return new URL(path, new URL('public/', window.location.href)).href;
+}
+
+function detailURL(terrain) {
+    return publicURL(terrain.detailPage || `terreno${terrain.id}.html`);
+}
+
+// Render the listing cards; the static cards stay when nothing was loaded,
+// and those whose detail page is not in the catalog are kept after it
+function displayProperties() {
+    const grid = document.querySelector('.properties-grid');
+    if (!grid || properties.length === 0) return;
+    
+    if (staticCards === null) {
+        staticCards = Array.from(grid.querySelectorAll('.property-card')).map(card => {
+            const link = card.querySelector('.btn-details');
+            return { href: link ? link.href : null, html: card.outerHTML };
+        });
+    }
+    const catalogPages = new Set(properties.map(detailURL));
+    const extraCards = staticCards
+        .filter(card => !card.href || !catalogPages.has(card.href))
+        .map(card => card.html);
+    
+    grid.innerHTML = properties.map(terrain => `
+        <div class="property-card">
+            <div class="property-image">
+                <img src="${escapeHTML(publicURL(terrain.mainImage || '../img/default.jpg'))}" alt="${escapeHTML(terrain.name)}" loading="lazy">
+                ${terrain.badge ? `<div class="property-badge">${escapeHTML(terrain.badge)}</div>` : ''}
+            </div>
+            <div class="property-info">
+                <h3>${escapeHTML(terrain.name)}</h3>
+                <div class="price">${escapeHTML(formatPrice(terrain))}</div>
+                <div class="location">
+                    <i class="fas fa-map-marker-alt"></i>
+                    ${escapeHTML(terrain.location)}
+                </div>
+                <div class="size">
+                    <i class="fas fa-expand-arrows-alt"></i>
+                    ${escapeHTML(terrain.size)}
+                </div>
+                <a href="${escapeHTML(detailURL(terrain))}" class="btn-details">Ver Detalles</a>
+            </div>
+        </div>
+    `).concat(extraCards).join('');
+}
+
 function viewProperty(detailPage) {
     window.location.href = `public/${detailPage}`;
 }
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Catalog snapshot publisher for Terrenos Premium
+Publishes the terrains catalog as static JSON for the site: a pretty
+terrains.json, a compact terrains.min.json, a terrains/index.json with only
+the listing card fields, one terrains/<id>.json detail file per terrain and
+pre-compressed .gz/.br siblings of each. Every file is replaced atomically,
+and nothing is written when its content did not change.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Pre-compressed siblings written next to every published file
+COMPRESSED_SUFFIXES = ['.gz'] + (['.br'] if brotli is not None else [])
+
+# Fields listing cards need; currency and detailPage complete price and link
+CARD_FIELDS = ('id', 'name', 'price', 'currency', 'size', 'badge', 'mainImage', 'location', 'detailPage')
+# Supabase rows use snake_case, the hand-written terrains.json camelCase
+FIELD_ALIASES = {'mainImage': 'main_image', 'detailPage': 'detail_page'}
+
+# Terrain ids that are safe to use as detail file names
+SHARD_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+def atomic_write(path, data):
+    """Write bytes to a temp file in the same directory, then rename it over
+    path, so readers see either the old or the new file, never a partial one"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files; static hosts need them readable
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def compressed_siblings(data):
+    """(suffix, bytes) for each available pre-compressed encoding"""
+    # mtime=0 keeps the gzip output identical for identical content
+    siblings = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        siblings.append(('.br', brotli.compress(data)))
+    return siblings
+
+def publish_file(path, data, compress=True):
+    """Atomically write path and its compressed siblings; returns the paths"""
+    written = []
+    if compress:
+        # Siblings first, so a host preferring them never serves older content
+        for suffix, encoded in compressed_siblings(data):
+            atomic_write(path + suffix, encoded)
+            written.append(path + suffix)
+    atomic_write(path, data)
+    written.append(path)
+    return written
+
+def file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+class RowSerializer:
+    """Serializes catalog rows to compact and pretty JSON fragments, reusing
+    the fragments of rows that are unchanged since the previous call"""
+
+    def __init__(self):
+        self._fragments = {}
+
+    def serialize(self, rows):
+        previous = self._fragments
+        fragments = {}
+        compact = []
+        pretty = []
+        for row in rows:
+            cached = previous.get(row.get('id'))
+            if cached is None or cached[0] != row:
+                body = json.dumps(row, ensure_ascii=False, indent=2)
+                cached = (
+                    row,
+                    json.dumps(row, ensure_ascii=False, separators=(',', ':')),
+                    # Nested one level, as json.dump(rows, indent=2) would write it
+                    '  ' + body.replace('\n', '\n  ')
+                )
+            fragments[row.get('id')] = cached
+            compact.append(cached[1])
+            pretty.append(cached[2])
+        self._fragments = fragments
+
+        compact_json = '[' + ','.join(compact) + ']'
+        pretty_json = '[\n' + ',\n'.join(pretty) + '\n]' if pretty else '[]'
+        return compact_json.encode('utf-8'), pretty_json.encode('utf-8')
+
+class CatalogSnapshot:
+    """Publishes the catalog as <name>.json (pretty) and <name>.min.json
+    (compact), skipping the write when the content hash is unchanged"""
+
+    def __init__(self, directory='public', name='terrains', compress=True):
+        self.pretty_path = os.path.join(directory, f'{name}.json')
+        self.compact_path = os.path.join(directory, f'{name}.min.json')
+        self.compress = compress
+        self.serializer = RowSerializer()
+        self.digest = None
+        self._lock = threading.Lock()
+
+    def outputs(self):
+        paths = [self.pretty_path, self.compact_path]
+        if self.compress:
+            paths += [path + suffix for path in (self.pretty_path, self.compact_path) for suffix in COMPRESSED_SUFFIXES]
+        return paths
+
+    def publish(self, rows):
+        """Publish rows; returns whether files changed, the content hash
+        and the files written"""
+        with self._lock:
+            compact, pretty = self.serializer.serialize(rows)
+            digest = hashlib.sha256(compact).hexdigest()
+
+            if self.digest is None:
+                # First publish in this process: compare with what is on disk
+                self.digest = file_digest(self.compact_path)
+            if digest == self.digest and all(os.path.exists(path) for path in self.outputs()):
+                return {'changed': False, 'sha256': digest, 'count': len(rows), 'files': []}
+
+            written = publish_file(self.compact_path, compact, self.compress)
+            written += publish_file(self.pretty_path, pretty, self.compress)
+            self.digest = digest
+            return {'changed': True, 'sha256': digest, 'count': len(rows), 'files': written}
+
+def parse_timestamp(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+class CatalogState:
+    """In-memory copy of the published catalog, kept current by merging
+    change-feed batches: rows changed since the high-water mark plus
+    tombstones for deleted or disabled terrains.
+
+    Every event carries a timestamp (updated_at or deleted_at); for each id
+    only the newest event wins, so re-reading an overlapping window is safe."""
+
+    def __init__(self, overlap=5.0):
+        self.overlap = timedelta(seconds=overlap)
+        self.watermark = None
+        self._rows = {}
+        self._versions = {}
+
+    def reset(self, rows, watermark=None):
+        """Replace the state with a full export of enabled rows"""
+        self._rows = {}
+        self._versions = {}
+        self.watermark = self._capped(watermark)
+        self.apply(rows, [])
+
+    def since(self):
+        """Timestamp to fetch changes from: the watermark minus the overlap,
+        covering transactions that committed after later ones"""
+        return None if self.watermark is None else self.watermark - self.overlap
+
+    def _newer(self, terrain_id, timestamp):
+        current = self._versions.get(terrain_id)
+        return current is None or timestamp is None or timestamp >= current
+
+    @staticmethod
+    def _capped(timestamp):
+        """timestamp capped at the current time, so a future-dated event
+        cannot move the watermark (or an id's version) past changes that
+        have not happened yet"""
+        if timestamp is None:
+            return None
+        return min(timestamp, datetime.now(timestamp.tzinfo))
+
+    def _advance(self, timestamp):
+        if timestamp is not None and (self.watermark is None or timestamp > self.watermark):
+            self.watermark = timestamp
+
+    def apply(self, rows, tombstones):
+        """Merge changed rows and tombstones; returns whether the set of
+        published rows changed"""
+        changed = False
+        for row in rows:
+            timestamp = self._capped(parse_timestamp(row.get('updated_at')))
+            self._advance(timestamp)
+            if not self._newer(row['id'], timestamp):
+                continue
+            self._versions[row['id']] = timestamp
+            if row.get('enabled', True):
+                if self._rows.get(row['id']) != row:
+                    self._rows[row['id']] = row
+                    changed = True
+            elif self._rows.pop(row['id'], None) is not None:
+                changed = True
+
+        for tombstone in tombstones:
+            timestamp = self._capped(parse_timestamp(tombstone.get('deleted_at')))
+            self._advance(timestamp)
+            if not self._newer(tombstone['terrain_id'], timestamp):
+                continue
+            self._versions[tombstone['terrain_id']] = timestamp
+            if self._rows.pop(tombstone['terrain_id'], None) is not None:
+                changed = True
+
+        self._prune()
+        return changed
+
+    def _prune(self):
+        # Removed ids only need a version while stale events can still be
+        # re-read inside the overlap window
+        since = self.since()
+        if since is None:
+            return
+        for terrain_id in [terrain_id for terrain_id, timestamp in self._versions.items()
+                           if terrain_id not in self._rows and timestamp is not None and timestamp < since]:
+            del self._versions[terrain_id]
+
+    def rows(self):
+        """Published rows, newest first like the full export"""
+        return sorted(self._rows.values(), key=lambda row: (row.get('created_at') or '', str(row['id'])), reverse=True)
+
+    def __len__(self):
+        return len(self._rows)
+
+def catalog_card(row):
+    """The listing card fields of a catalog row"""
+    card = {}
+    for field in CARD_FIELDS:
+        value = row.get(field)
+        if value is None and field in FIELD_ALIASES:
+            value = row.get(FIELD_ALIASES[field])
+        if value is not None:
+            card[field] = value
+    return card
+
+def remove_file(path, compress=True):
+    """Remove path and its compressed siblings; returns the paths removed"""
+    removed = []
+    for candidate in [path] + ([path + suffix for suffix in COMPRESSED_SUFFIXES] if compress else []):
+        try:
+            os.unlink(candidate)
+            removed.append(candidate)
+        except FileNotFoundError:
+            pass
+    return removed
+
+class CatalogShards:
+    """Publishes <directory>/index.json with the card fields of every terrain
+    and one <directory>/<id>.json detail file per terrain. Only detail files
+    whose row changed are rewritten; those of removed terrains are deleted."""
+
+    def __init__(self, directory='public/terrains', compress=True):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.compress = compress
+        self.index_digest = None
+        self._details = None
+        self._lock = threading.Lock()
+
+    def detail_path(self, terrain_id):
+        return os.path.join(self.directory, f'{terrain_id}.json')
+
+    def _published_ids(self):
+        """Detail files already on disk, for the first publish in a process"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return {}
+        ids = [name[:-len('.json')] for name in names if name.endswith('.json') and name != 'index.json']
+        return {terrain_id: (None, file_digest(self.detail_path(terrain_id))) for terrain_id in ids}
+
+    def publish(self, rows):
+        """Publish rows; returns whether anything changed and the files
+        written and removed"""
+        with self._lock:
+            previous = self._details if self._details is not None else self._published_ids()
+            details = {}
+            cards = []
+            written = []
+            for row in rows:
+                terrain_id = str(row.get('id'))
+                if not SHARD_NAME.match(terrain_id):
+                    print(f"Skipping detail file for terrain id {terrain_id!r}")
+                    continue
+                cards.append(catalog_card(row))
+
+                cached = previous.get(terrain_id)
+                path = self.detail_path(terrain_id)
+                if cached is not None and cached[0] == row and os.path.exists(path):
+                    details[terrain_id] = cached
+                    continue
+                data = json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                digest = hashlib.sha256(data).hexdigest()
+                if cached is None or cached[1] != digest or not os.path.exists(path):
+                    written += publish_file(path, data, self.compress)
+                details[terrain_id] = (row, digest)
+
+            removed = []
+            for terrain_id in set(previous) - set(details):
+                removed += remove_file(self.detail_path(terrain_id), self.compress)
+            self._details = details
+
+            index = json.dumps(cards, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            digest = hashlib.sha256(index).hexdigest()
+            if self.index_digest is None:
+                self.index_digest = file_digest(self.index_path)
+            if digest != self.index_digest or not os.path.exists(self.index_path):
+                written += publish_file(self.index_path, index, self.compress)
+                self.index_digest = digest
+
+            return {'changed': bool(written or removed), 'files': written, 'removed': removed}